@@ -0,0 +1,93 @@
+import threading
+
+# Weights are kept as integer units so a track's weight can be split between its artists and tied genres still
+# compare exactly. 2520 divides evenly by every artist count from 1 to 10.
+WEIGHT_UNITS = 2520
+
+# Genres are interned to small integer IDs once, so repeated counts hash ints instead of strings
+genre_ids = {}
+genre_names = []
+genre_lock = threading.Lock()
+
+# Get the ID of a genre, assigning the next free one the first time it's seen
+def intern_genre(genre: str) -> int:
+    genre_id = genre_ids.get(genre)
+
+    if genre_id is None:
+        with genre_lock:
+            genre_id = genre_ids.get(genre)
+            if genre_id is None:
+                genre_id = len(genre_names)
+                genre_names.append(genre)
+                genre_ids[genre] = genre_id
+
+    return genre_id
+
+# The genres tied for the highest count
+class GenreSummary:
+    __slots__ = ('top_genres',)
+
+    def __init__(self, genre_scores: dict, tied: list):
+
+        # Tied genres are ordered by rank weighted score, then by name for a consistent order
+        self.top_genres = [genre_names[genre_id] for genre_id in sorted(tied, key=lambda genre_id: (-genre_scores[genre_id], genre_names[genre_id]))]
+
+# Counts genres as they're added, keeping track of the genres tied for the highest count along the way
+class GenreCounter:
+    def __init__(self):
+        self.counts = {}
+        self.scores = {}
+        self.max_count = 0
+        self.tied = []
+
+    # Add a weight to each genre, and the weight times rank_weight to its score
+    def add(self, genres: list, weight: int, rank_weight: int):
+        counts = self.counts
+        scores = self.scores
+        score = weight * rank_weight
+
+        for genre in genres:
+            genre_id = genre_ids.get(genre)
+            if genre_id is None:
+                genre_id = intern_genre(genre)
+
+            if genre_id in counts:
+                count = counts[genre_id] + weight
+                scores[genre_id] += score
+            else:
+                count = weight
+                scores[genre_id] = score
+            counts[genre_id] = count
+
+            # Counts only grow, so a genre passing the max starts a new tie and one reaching it joins the tie
+            if count > self.max_count:
+                self.max_count = count
+                self.tied = [genre_id]
+            elif count == self.max_count:
+                self.tied.append(genre_id)
+
+    def summary(self) -> GenreSummary:
+        return GenreSummary(self.scores, self.tied)
+
+# Count genres of the top artists and the artists of the top tracks in one pass. Each top artist counts its genres
+# once and each top track counts once, split evenly between its artists. Scores also weigh each item by its rank,
+# so the first of n items counts n times and the last once. artist_genres maps track artist IDs to their genres.
+def analyze_genres(artists: list, tracks: list = (), artist_genres: dict = None) -> GenreSummary:
+
+    counter = GenreCounter()
+    artist_genres = artist_genres or {}
+
+    artist_count = len(artists)
+    for rank, artist in enumerate(artists):
+        counter.add(artist.genres, WEIGHT_UNITS, artist_count - rank)
+
+    track_count = len(tracks)
+    for rank, track in enumerate(tracks):
+        if not track.artist_ids:
+            continue
+
+        share = WEIGHT_UNITS // len(track.artist_ids)
+        for artist_id in track.artist_ids:
+            counter.add(artist_genres.get(artist_id, ()), share, track_count - rank)
+
+    return counter.summary()
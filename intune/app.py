@@ -1,11 +1,19 @@
 import os
+import json
+import math
 import time
+import cache
+import assets
+import hashlib
 import spotify
 import logging
-import requests
-import image_generator
-from collections import Counter
-from flask import Flask, render_template, send_from_directory, redirect, url_for, jsonify, send_file, make_response, session, request
+import sessions
+import analytics
+import mimetypes
+import compression
+from io import BytesIO
+from markupsafe import Markup
+from flask import Flask, render_template, stream_template, send_from_directory, redirect, url_for, jsonify, send_file, make_response, session, request, Response
 
 # Set up logging
 logging.basicConfig(level=logging.DEBUG)
@@ -14,8 +22,42 @@ logger = logging.getLogger(__name__)
 app = Flask(__name__)
 
 app.secret_key = os.environ.get('SECRET_KEY', os.urandom(24))
+app.session_interface = sessions.create_session_interface()
 test_refresh_token = os.environ.get('TEST_REFRESH_TOKEN')
 
+# Stream the dashboard so the page shell is sent while the Spotify requests are in flight. Streamed chunks are joined
+# into writes of up to STREAM_BUFFER_BYTES, and what's buffered is sent right away wherever a template outputs STREAM_FLUSH.
+STREAM_DASHBOARD = os.environ.get('STREAM_DASHBOARD', '1') == '1'
+STREAM_BUFFER_BYTES = int(os.environ.get('STREAM_BUFFER_BYTES', 16 * 1024))
+STREAM_FLUSH = '<!-- flush -->'
+
+# Point static urls at the content hashed copies from scripts/build_assets.py, when they've been built
+@app.url_defaults
+def hashed_static_url(endpoint: str, values: dict):
+    if endpoint == 'static' and 'filename' in values:
+        values['filename'] = assets.get_asset_path(values['filename'])
+
+# Serve built assets with a year long immutable cache, their names change whenever their content does. Clients that
+# accept brotli or gzip get the precompressed copy.
+@app.route('/static/dist/<path:filename>')
+def built_static(filename):
+    encoding, suffix = assets.get_encoding(f'dist/{filename}', request.accept_encodings)
+    mimetype = mimetypes.guess_type(filename)[0]
+
+    response = send_from_directory(os.path.join(app.static_folder, 'dist'), filename + suffix, mimetype=mimetype, max_age=assets.ASSET_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+
+    return response
+
+# Compress HTML and JSON responses with brotli or gzip when the client accepts it, see compression.py
+@app.after_request
+def compress_response(response: Response) -> Response:
+    return compression.compress_response(response, request.accept_encodings)
+
 @app.route('/favicon.ico')
 def favicon():
     return send_from_directory(os.path.join(app.root_path, 'static'),
@@ -32,7 +74,21 @@ def index():
         return redirect(url_for('dashboard', time_range='short_term'))
     else:
         logger.debug('No access token found, showing login page.')
-        return render_template('index.html')
+        return render_template('index.html', backgrounds=get_backgrounds())
+
+# Background images for the login page, with their resized AVIF and WebP copies when they've been built
+def get_backgrounds() -> list[dict]:
+    backgrounds = []
+    for i in range(1, 11):
+        filename = f'images/bg{i}.jpg'
+        variants = assets.get_image_variants(filename)
+
+        backgrounds.append({
+            'src': url_for('static', filename=filename),
+            'variants': {mimetype: [[width, url_for('static', filename=path)] for width, path in sizes] for mimetype, sizes in variants.items()}
+        })
+
+    return backgrounds
 
 # Get authentication url and redirect to Spotify auth page
 @app.route('/login')
@@ -55,37 +111,53 @@ def callback():
     # Attempt to get access token from auth code, store token, and redirect to dashboard
     try:
         logger.debug('Exchanging auth code for access token.')
-        access_token, refresh_token = spotify.get_access_token(auth_code)
+        access_token, refresh_token, expires_in = spotify.get_access_token(auth_code)
         
-        logger.debug('Storing tokens in session.')
+        logger.debug('Storing tokens in a new session.')
+        sessions.start_new_session(session)
         session['access_token'] = access_token
         session['refresh_token'] = refresh_token
         session['auth_time'] = time.time()
+        session['expires_at'] = time.time() + expires_in
 
         # Fetch and store the user's profile information
         logger.debug('Fetching user profile.')
         user_profile = spotify.get_user_profile(access_token)
         session['user_profile'] = user_profile
+
+        # Load every time range in the background so switching ranges on the dashboard is served from the cache,
+        # when warm-up is enabled
+        spotify.warm_up(access_token, user_profile.get('user_id'))
         
         return redirect(url_for('dashboard', time_range='short_term'))
     except Exception as e:
         logger.error(f'Error in callback: {str(e)}.')
         return render_template('error.html', error=str(e))
 
-# Check if access token is still valid, and refresh it if needed
-def verify_token():
+# Get a user facing message for a Spotify error, telling rate limited users when to try again
+def get_error_message(error: Exception) -> str:
+    if isinstance(error, spotify.SpotifyRateLimitError):
+        return f'Spotify is busy right now, please try again in {math.ceil(error.retry_after)} seconds.'
+    return str(error)
+
+# Check if access token is still valid, and refresh it if needed. Pass force=True when Spotify rejected the token.
+def verify_token(force=False):
     access_token = session.get('access_token')
     refresh_token = session.get('refresh_token')
-    auth_time = session.get('auth_time', 0)
+
+    # Older sessions don't have an expiry time, tokens from those expire an hour after auth
+    expires_at = session.get('expires_at', session.get('auth_time', 0) + spotify.DEFAULT_EXPIRES_IN)
     
-    # Tokens expire after 3600 seconds (1 hour)
-    # Refresh if token is older than 50 minutes
-    if time.time() - auth_time > 3000 and refresh_token:
+    # Refresh shortly before the token expires, concurrent requests from the same user share one refresh
+    if refresh_token and (force or time.time() > expires_at - spotify.TOKEN_REFRESH_MARGIN):
         try:
             logger.debug('Refreshing access token.')
-            new_access_token = spotify.refresh_access_token(refresh_token)
+            stale_token = access_token if force else None
+            new_access_token, expires_at, new_refresh_token = spotify.refresh_user_token(refresh_token, stale_token)
             session['access_token'] = new_access_token
+            session['refresh_token'] = new_refresh_token
             session['auth_time'] = time.time()
+            session['expires_at'] = expires_at
             return new_access_token
         except Exception as e:
             logger.error(f'Error refreshing token: {str(e)}.')
@@ -98,17 +170,19 @@ def verify_token():
 def test_login():
     logger.debug('Starting test login process')
     
-    # Use environment variables or a secure config for these values
-    test_access_token = spotify.refresh_access_token(test_refresh_token)
-    
-    if not test_access_token or not test_refresh_token:
+    if not test_refresh_token:
         logger.error('Test credentials not configured')
         return render_template('error.html', error="Test mode not configured")
+
+    # Use environment variables or a secure config for these values
+    test_access_token, expires_at, refresh_token = spotify.refresh_user_token(test_refresh_token)
     
-    # Store test tokens in session
+    # Store test tokens in a new session
+    sessions.start_new_session(session)
     session['access_token'] = test_access_token
-    session['refresh_token'] = test_refresh_token
+    session['refresh_token'] = refresh_token
     session['auth_time'] = time.time()
+    session['expires_at'] = expires_at
     session['test_mode'] = True
 
     # Fetch and store user profile for test account
@@ -116,6 +190,9 @@ def test_login():
         logger.debug('Fetching test user profile.')
         user_profile = spotify.get_user_profile(test_access_token)
         session['user_profile'] = user_profile
+
+        # Load every time range in the background, same as a normal login
+        spotify.warm_up(test_access_token, user_profile.get('user_id'))
     except Exception as e:
         logger.warning(f'Could not fetch test user profile: {str(e)}.')
     
@@ -131,9 +208,17 @@ def check_session():
     return jsonify({
         "has_token": "access_token" in session,
         "auth_time": session.get("auth_time", None),
+        "expires_at": session.get("expires_at", None),
         "session_keys": list(session.keys())
     })
 
+# Endpoint to debug cache hit rates and memory use
+@app.route('/cache-stats')
+def cache_stats():
+    stats = cache.get_stats()
+    stats['session'] = app.session_interface.stats()
+    return jsonify(stats)
+
 # Clear the current session and log the user out
 @app.route('/logout')
 def logout():
@@ -215,127 +300,302 @@ def dashboard():
             logger.warning(f'Could not fetch user profile: {str(e)}.')
             user_profile = None
     
-    # Get time range from query parameter, default to short_term
-    time_range = request.args.get('time_range', 'short_term')
-
-    # Get limit from query parameter, default to 10
-    limit = int(request.args.get('limit', 10))
+    time_range, limit, refresh = get_view_args()
+    user_id = user_profile.get('user_id') if user_profile else None
+
+    # Set before rendering, a streamed response has already sent its session cookie by the time the data is loaded
+    set_current_tracks(time_range, limit)
+
+    # Send the header, profile and CSS links first and the grids once the top items arrive. Errors are shown in place
+    # of the grids since the page has already started.
+    if STREAM_DASHBOARD:
+        data = LazyDashboardData(lambda: load_streamed_dashboard_data(access_token, user_id, time_range, limit, refresh))
+        stream = stream_template('dashboard.html',
+                                 data=data,
+                                 stream_flush=Markup(STREAM_FLUSH),
+                                 current_time_range=time_range,
+                                 current_limit=limit,
+                                 max_limit=spotify.MAX_TOP_ITEMS,
+                                 user_profile=user_profile)
+        response = Response(buffer_stream(stream), mimetype='text/html')
+
+        # Ask proxies like nginx to pass chunks on as they're written instead of buffering the whole page
+        response.headers['X-Accel-Buffering'] = 'no'
+        return response
 
-    # Make sure limit is between 5 and 50
-    limit = max(5, min(50, limit))
-    
     try:
-        # Get user's top artists and tracks during specified time range
-        logger.debug(f'Fetching top items from Spotify API with time_range={time_range}, limit={limit}.')
-        artists_data, tracks_data = spotify.get_top_items(access_token, time_range, limit)
-
-        # Format raw API data into DataFrames
-        logger.debug('Parsing API data into DataFrames.')
-        final_artists, total_artists = spotify.parse_artists_data(artists_data)
-        final_tracks, total_tracks = spotify.parse_tracks_data(tracks_data)
-
-        # Create placeholder data to fill empty grid slots if needed
-        artist_count = len(final_artists)
-        track_count = len(final_tracks)
-
-        # If there are fewer than the requested limit of artists, add empty placeholders
-        if artist_count < limit:
-            for i in range(limit - artist_count):
-                placeholder = {
-                    'id': f'placeholder-artist-{i}',
-                    'name': 'No Data Available',
-                    'genres': [],
-                    'popularity': 0,
-                    'followers': 0,
-                    'link': '#',
-                    'image': None
-                }
-                final_artists.loc[len(final_artists)] = placeholder
-
-        # If there are fewer than the requested limit of tracks, add empty placeholders
-        if track_count < limit:
-            for i in range(limit - track_count):
-                placeholder = {
-                    'id': f'placeholder-track-{i}',
-                    'name': 'No Data Available',
-                    'artists': [''],
-                    'release_date': '',
-                    'popularity': 0,
-                    'link': '#',
-                    'image': None
-                }
-                final_tracks.loc[len(final_tracks)] = placeholder
-
-        genres_df = final_artists.copy()
-
-        # Process genre data if there are any artists with genre information
-        if not genres_df.empty and 'genres' in genres_df.columns:
-
-            # Ensure 'genres' values are all lists, and flatten before counting
-            genres_df['genres'] = genres_df['genres'].apply(lambda x: x if isinstance(x, list) else eval(x) if isinstance(x, str) and x.startswith('[') else [])
-            all_genres = [genre for sublist in genres_df['genres'] for genre in sublist]
-            genre_counts = Counter(all_genres)
-
-            # Get the max count of each genre value
-            max_count = max(genre_counts.values(), default=0)
-            top_genres = [genre for genre, count in genre_counts.items() if count == max_count]
-            
-            # Sort genres for consistent ordering
-            top_genres.sort()
-            
-            # Handle three cases for formatting
-            if len(top_genres) == 1:
-                # Case 1: Single top genre
-                top_genre = top_genres[0]
-                genre_string = 'Your top genre is '
-            elif len(top_genres) == 2:
-                # Case 2: 2-way tie
-                top_genre = f"{top_genres[0]} and {top_genres[1]}"
-                genre_string = 'Your top genres are '
-            else:
-                # Case 3: 3-way or more tie (show first 3)
-                top_genre = f"{', '.join(top_genres[:2])}, and {top_genres[2]}"
-                genre_string = 'Your top genres are '
-        else:
-            # Handle case where no genre data is available
-            top_genre = ''
-            genre_string = 'No genres found in your top artists.'
-
-        # Convert DataFrames to dictionaries for template rendering
-        artists = final_artists.to_dict('records')
-        tracks = final_tracks.to_dict('records')
-
-        # Store track IDs in session for playlist creation
-        track_ids = [track['id'] for track in tracks if not str(track.get('id')).startswith('placeholder')]
-        session['current_track_ids'] = track_ids
-        
-        # Calculate average popularity of artists and tracks if data is available
-        avg_artist_popularity = round(final_artists[:artist_count]['popularity'].mean(), 1) if artist_count > 0 else 0
-        avg_track_popularity = round(final_tracks[:track_count]['popularity'].mean(), 1) if track_count > 0 else 0
+        dashboard_data = get_dashboard_data(access_token, user_id, time_range, limit, refresh)
+        set_current_tracks(time_range, limit, dashboard_data['tracks'][:dashboard_data['actual_track_count']])
 
         # Add all data to the dashboard render_template call
-        logger.debug(f'Rendering dashboard with {artist_count} artists and {track_count} tracks.')
+        logger.debug(f'Rendering dashboard with {dashboard_data["actual_artist_count"]} artists and {dashboard_data["actual_track_count"]} tracks.')
         return render_template('dashboard.html', 
-                            artists=artists, 
-                            tracks=tracks,
-                            top_genre=top_genre,
-                            genre_string=genre_string,
-                            total_artists=total_artists,
-                            total_tracks=total_tracks,
-                            actual_artist_count=artist_count,
-                            actual_track_count=track_count,
-                            avg_artist_popularity=avg_artist_popularity,
-                            avg_track_popularity=avg_track_popularity,
+                            data=dashboard_data,
                             current_time_range=time_range,
                             current_limit=limit,
+                            max_limit=spotify.MAX_TOP_ITEMS,
                             user_profile=user_profile)
     
+    # If Spotify is rate limiting or having issues, keep the user logged in so they can try again
+    except spotify.SpotifyError as e:
+        logger.error(f'Spotify error in dashboard: {str(e)}.')
+        if not e.is_transient:
+            session.clear()
+        return render_template('error.html', error=get_error_message(e))
+
     # If there's an error, clear the session and redirect to login flow
     except Exception as e:
         logger.error(f'Error in dashboard: {str(e)}.')
         session.clear()
         return render_template('error.html', error=str(e))
 
+# Dashboard data loaded the first time the template reads from it, so a streamed page can send its shell first
+class LazyDashboardData:
+    def __init__(self, load):
+        self.load = load
+        self.values = None
+
+    def __getattr__(self, name: str):
+        if self.values is None:
+            self.values = self.load()
+
+        try:
+            return self.values[name]
+        except KeyError:
+            raise AttributeError(name)
+
+# Get the dashboard data while the page is streaming, errors are returned for the template to show. The session
+# can't be cleared anymore, so errors that need a new sign in link to logout instead.
+def load_streamed_dashboard_data(access_token: str, user_id: str, time_range: str, limit: int, refresh=False) -> dict:
+
+    try:
+        dashboard_data = get_dashboard_data(access_token, user_id, time_range, limit, refresh)
+        logger.debug(f'Streaming dashboard with {dashboard_data["actual_artist_count"]} artists and {dashboard_data["actual_track_count"]} tracks.')
+        return dashboard_data
+
+    except spotify.SpotifyError as e:
+        logger.error(f'Spotify error in streamed dashboard: {str(e)}.')
+        return {'error': get_error_message(e), 'sign_in_again': not e.is_transient}
+
+    except Exception as e:
+        logger.error(f'Error in streamed dashboard: {str(e)}.')
+        return {'error': str(e), 'sign_in_again': True}
+
+# Join the small chunks of a streamed template into larger writes, sending the buffer early at each flush marker
+def buffer_stream(chunks):
+
+    buffer = []
+    buffered_bytes = 0
+
+    try:
+        for chunk in chunks:
+            flush = STREAM_FLUSH in chunk
+            if flush:
+                chunk = chunk.replace(STREAM_FLUSH, '')
+
+            buffer.append(chunk)
+            buffered_bytes += len(chunk)
+
+            if flush or buffered_bytes >= STREAM_BUFFER_BYTES:
+                yield ''.join(buffer)
+                buffer = []
+                buffered_bytes = 0
+
+        if buffer:
+            yield ''.join(buffer)
+    finally:
+        # Closing the template stream tears down the request context it runs in
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+# Fields of each artist and track card sent by the top items API, in order
+ARTIST_FIELDS = ['name', 'image', 'genres', 'popularity', 'followers', 'link']
+TRACK_FIELDS = ['name', 'image', 'artists', 'popularity', 'release_date', 'link']
+
+# Dashboard data as compact JSON, used by the dashboard to switch time range or item count without reloading the page.
+# Cards are sent as arrays in the order of the field lists, and the page adds its own placeholders.
+@app.route('/api/top-items')
+def top_items_api():
+    access_token = verify_token()
+
+    if not access_token:
+        return jsonify({'error': 'Authentication required'}), 401
+
+    user_profile = session.get('user_profile') or {}
+    time_range, limit, refresh = get_view_args()
+    set_current_tracks(time_range, limit)
+
+    try:
+        dashboard_data = get_dashboard_data(access_token, user_profile.get('user_id'), time_range, limit, refresh)
+
+    # Same handling as the dashboard, keep the user logged in unless Spotify rejected them
+    except spotify.SpotifyError as e:
+        logger.error(f'Spotify error in top items API: {str(e)}.')
+        if not e.is_transient:
+            session.clear()
+        return jsonify({'error': get_error_message(e)}), e.status_code or 500
+
+    except Exception as e:
+        logger.error(f'Error in top items API: {str(e)}.')
+        session.clear()
+        return jsonify({'error': str(e)}), 500
+
+    artists = dashboard_data['artists'][:dashboard_data['actual_artist_count']]
+    tracks = dashboard_data['tracks'][:dashboard_data['actual_track_count']]
+    set_current_tracks(time_range, limit, tracks)
+
+    return compact_json({
+        'time_range': time_range,
+        'limit': limit,
+        'genre': [dashboard_data['genre_string'], dashboard_data['top_genre']],
+        'artists': {
+            'total': dashboard_data['total_artists'],
+            'avg_popularity': dashboard_data['avg_artist_popularity'],
+            'fields': ARTIST_FIELDS,
+            'items': [[getattr(artist, field) for field in ARTIST_FIELDS] for artist in artists]
+        },
+        'tracks': {
+            'total': dashboard_data['total_tracks'],
+            'avg_popularity': dashboard_data['avg_track_popularity'],
+            'fields': TRACK_FIELDS,
+            'items': [[getattr(track, field) for field in TRACK_FIELDS] for track in tracks]
+        }
+    })
+
+# Serialize a payload without whitespace, it's compressed with the other responses after the request
+def compact_json(payload) -> Response:
+
+    response = make_response(json.dumps(payload, separators=(',', ':')))
+    response.mimetype = 'application/json'
+    response.headers['Cache-Control'] = 'private, no-cache'
+
+    return response
+
+# Get the time range, item limit and refresh flag of the requested dashboard view
+def get_view_args() -> tuple[str, int, bool]:
+
+    # Get time range from query parameter, default to short_term
+    time_range = request.args.get('time_range', 'short_term')
+
+    # Get limit from query parameter, default to 10
+    limit = int(request.args.get('limit', 10))
+
+    # Make sure limit is between 5 and the most items that can be fetched
+    limit = max(5, min(spotify.MAX_TOP_ITEMS, limit))
+
+    # Skip the cache when the user explicitly asks for fresh data
+    refresh = request.args.get('refresh') == '1'
+
+    return time_range, limit, refresh
+
+# Get the top artists and tracks, genre summary and popularity averages shown on the dashboard
+def get_dashboard_data(access_token: str, user_id: str, time_range: str, limit: int, refresh=False) -> dict:
+
+    # Get user's top artists and tracks during specified time range
+    logger.debug(f'Fetching top items with time_range={time_range}, limit={limit}.')
+    artists_data, tracks_data = spotify.get_cached_top_items(access_token, user_id, time_range, limit, refresh)
+
+    # Format raw API data into artist and track records
+    logger.debug('Parsing API data into records.')
+    final_artists, total_artists = spotify.parse_artists_data(artists_data)
+    final_tracks, total_tracks = spotify.parse_tracks_data(tracks_data)
+
+    # Create placeholder data to fill empty grid slots if needed
+    artist_count = len(final_artists)
+    track_count = len(final_tracks)
+
+    # If there are fewer than the requested limit of artists, add empty placeholders
+    if artist_count < limit:
+        final_artists.extend(spotify.Artist.placeholder(i) for i in range(limit - artist_count))
+
+    # If there are fewer than the requested limit of tracks, add empty placeholders
+    if track_count < limit:
+        final_tracks.extend(spotify.Track.placeholder(i) for i in range(limit - track_count))
+
+    # Count genres of the top artists and the artists of the top tracks
+    artist_genres = get_track_artist_genres(access_token, final_artists[:artist_count], final_tracks[:track_count])
+    genre_summary = analytics.analyze_genres(final_artists[:artist_count], final_tracks[:track_count], artist_genres)
+
+    # Process genre data if there are any artists with genre information
+    if genre_summary.top_genres:
+
+        # Genres tied for the highest count, best ranked first
+        top_genres = genre_summary.top_genres
+        
+        # Handle three cases for formatting
+        if len(top_genres) == 1:
+            # Case 1: Single top genre
+            top_genre = top_genres[0]
+            genre_string = 'Your top genre is '
+        elif len(top_genres) == 2:
+            # Case 2: 2-way tie
+            top_genre = f"{top_genres[0]} and {top_genres[1]}"
+            genre_string = 'Your top genres are '
+        else:
+            # Case 3: 3-way or more tie (show first 3)
+            top_genre = f"{', '.join(top_genres[:2])}, and {top_genres[2]}"
+            genre_string = 'Your top genres are '
+    else:
+        # Handle case where no genre data is available
+        top_genre = ''
+        genre_string = 'No genres found in your top artists.'
+
+    # Calculate average popularity of artists and tracks if data is available
+    avg_artist_popularity = round(sum(artist.popularity for artist in final_artists[:artist_count]) / artist_count, 1) if artist_count > 0 else 0
+    avg_track_popularity = round(sum(track.popularity for track in final_tracks[:track_count]) / track_count, 1) if track_count > 0 else 0
+
+    return {
+        'artists': final_artists,
+        'tracks': final_tracks,
+        'top_genre': top_genre,
+        'genre_string': genre_string,
+        'total_artists': total_artists,
+        'total_tracks': total_tracks,
+        'actual_artist_count': artist_count,
+        'actual_track_count': track_count,
+        'avg_artist_popularity': avg_artist_popularity,
+        'avg_track_popularity': avg_track_popularity
+    }
+
+# Get the genres of the top tracks' artists from the batched artist cache, if that fails only top artists are counted
+def get_track_artist_genres(access_token: str, artists: list, tracks: list) -> dict:
+
+    spotify.cache_artist_genres(artists)
+
+    try:
+        artist_ids = [artist_id for track in tracks for artist_id in track.artist_ids]
+        return spotify.get_artist_genres(access_token, artist_ids)
+    except Exception as e:
+        logger.warning(f'Could not fetch genres of track artists: {str(e)}.')
+        return {}
+
+# Store the current view in session for playlist creation, along with the IDs of the tracks shown once they're loaded.
+# IDs are only kept for up to a page of tracks since a longer list doesn't fit in the session cookie, and streamed
+# dashboards send the cookie before the tracks load. Without them the tracks are looked up again from the cache.
+def set_current_tracks(time_range: str, limit: int, tracks: list = None):
+    session['current_tracks'] = [time_range, limit]
+
+    if tracks is not None and limit <= spotify.TOP_ITEMS_PAGE_SIZE:
+        session['current_track_ids'] = [track.id for track in tracks]
+    else:
+        session.pop('current_track_ids', None)
+
+# Get the IDs of the tracks currently shown on the dashboard
+def get_current_track_ids(access_token: str) -> list:
+
+    if 'current_track_ids' in session:
+        return session['current_track_ids']
+
+    current_tracks = session.get('current_tracks')
+    if not current_tracks:
+        return []
+
+    time_range, limit = current_tracks
+    user_id = session.get('user_profile', {}).get('user_id')
+
+    _, tracks_data = spotify.get_cached_top_items(access_token, user_id, time_range, limit)
+    return [item['id'] for item in tracks_data['items']]
+
 # Route to handle playlist creation
 @app.route('/create-playlist', methods=['POST'])
 def create_playlist():
@@ -353,14 +613,18 @@ def create_playlist():
         if not playlist_name:
             return jsonify({'success': False, 'error': 'Playlist name is required'}), 400
 
-        track_ids = session.get('current_track_ids', [])
+        track_ids = get_current_track_ids(access_token)
         
         if not track_ids:
             return jsonify({'success': False, 'error': 'No tracks available'}), 400
 
         playlist_tracks = [{'id': track_id} for track_id in track_ids]
+        user_id = session.get('user_profile', {}).get('user_id')
 
-        playlist_info = spotify.create_playlist(access_token, playlist_name, playlist_tracks)
+        # Requests without a key from the page are keyed by their contents, so a double click still creates one playlist
+        idempotency_key = request.headers.get('Idempotency-Key') or hashlib.sha256(repr((playlist_name, track_ids)).encode()).hexdigest()
+
+        playlist_info = spotify.create_playlist_once(idempotency_key, access_token, user_id, playlist_name, playlist_tracks)
         logger.debug(f'Created playlist: {playlist_info}')
 
         return jsonify({
@@ -372,6 +636,25 @@ def create_playlist():
         logger.error(f'Error creating playlist: {str(e)}.')
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# Choose the story image format from the format query parameter, or the Accept header for non-page requests
+def get_story_format(formats: dict, default: str) -> str:
+
+    requested_format = request.args.get('format', '').lower()
+    if requested_format == 'jpg':
+        requested_format = 'jpeg'
+
+    if requested_format in formats:
+        return requested_format
+
+    # Page navigations advertise every image type they can display, so they keep the default
+    if any(mimetype == 'text/html' for mimetype, _ in request.accept_mimetypes):
+        return default
+
+    format_names = {mimetype: name for name, (_, mimetype, _) in formats.items()}
+    best_mimetype = request.accept_mimetypes.best_match([formats[default][1]] + list(format_names))
+
+    return format_names.get(best_mimetype, default)
+
 # Route to handle the generation of a shareable story image
 @app.route('/generate-story')
 def generate_story():
@@ -384,13 +667,34 @@ def generate_story():
         # Get time range from query parameter, default to short_term
         time_range = request.args.get('time_range', 'short_term')
 
-        # Get the user's top artists and tracks for the past month
-        artists_data, tracks_data = spotify.get_top_items(access_token, time_range, 5)
+        # Get the user's top artists and tracks for the selected time range
+        user_profile = session.get('user_profile')
+        user_id = user_profile.get('user_id') if user_profile else None
+        artists_data, tracks_data = spotify.get_cached_top_items(access_token, user_id, time_range, 5)
         final_artists, total_artists = spotify.parse_artists_data(artists_data)
         final_tracks, total_tracks = spotify.parse_tracks_data(tracks_data)
 
-        # Generate story image
-        img_buffer = image_generator.create_share_image(final_artists, final_tracks, total_artists, total_tracks, time_range)
+        # Imported here so Pillow is only loaded by the routes that draw images
+        import image_generator
+
+        # Pick the output format from the query string or Accept header
+        output_format = get_story_format(image_generator.STORY_FORMATS, image_generator.DEFAULT_STORY_FORMAT)
+        _, mimetype, extension = image_generator.STORY_FORMATS[output_format]
+        filename = f'intune-story.{extension}'
+
+        # Inputs are hashed into a strong ETag, so repeat requests for an unchanged story get a 304
+        story_key = image_generator.get_story_key(final_artists, final_tracks, total_artists, total_tracks, time_range, output_format=output_format)
+
+        if story_key in request.if_none_match:
+            response = make_response('', 304)
+            response.set_etag(story_key)
+            response.headers['Cache-Control'] = 'private, no-cache'
+            response.headers['Vary'] = 'Accept'
+            return response
+
+        # Generate story image, or reuse the cached render
+        image_bytes, complete = image_generator.get_story_image(final_artists, final_tracks, total_artists, total_tracks, time_range, output_format=output_format, key=story_key)
+        img_buffer = BytesIO(image_bytes)
 
         # Set headers for sharing and downloading using Web Share API
         user_agent = request.headers.get('User-Agent', '')
@@ -399,34 +703,50 @@ def generate_story():
             # Mobile - optimized for sharing
             response = make_response(send_file(
                 img_buffer,
-                mimetype='image/png',
+                mimetype=mimetype,
                 as_attachment=False,
-                download_name='intune-story.png'
+                download_name=filename
             ))
             
             # Add headers to help mobile browsers recognize the file type
-            response.headers['Content-Type'] = 'image/png'
-            response.headers['Content-Disposition'] = 'inline; filename="intune-story.png"'
-            response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
+            response.headers['Content-Type'] = mimetype
+            response.headers['Content-Disposition'] = f'inline; filename="{filename}"'
+            response.headers['Cache-Control'] = 'private, no-cache'
             response.headers['Pragma'] = 'no-cache'
             response.headers['Expires'] = '0'
+
+            # Renders missing artwork aren't cached, so don't let the browser keep them either
+            if complete:
+                response.set_etag(story_key)
+
+            response.headers['Vary'] = 'Accept'
             
             return response
         else:
             # Desktop - force download
             response = make_response(send_file(
                 img_buffer,
-                mimetype='image/png',
+                mimetype=mimetype,
                 as_attachment=True,
-                download_name='intune-story.png'
+                download_name=filename
             ))
             
             # Add headers for desktop download
-            response.headers['Content-Type'] = 'image/png'
-            response.headers['Content-Disposition'] = 'attachment; filename="intune-story.png"'
+            response.headers['Content-Type'] = mimetype
+            response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+            response.headers['Cache-Control'] = 'private, no-cache'
+
+            if complete:
+                response.set_etag(story_key)
+
+            response.headers['Vary'] = 'Accept'
             
             return response
         
+    except spotify.SpotifyError as e:
+        logger.error(f'Spotify error generating story: {str(e)}.')
+        return render_template('error.html', error=get_error_message(e))
+
     except Exception as e:
         logger.error(f'Error generating story: {str(e)}.')
         return render_template('error.html', error=str(e))
@@ -446,62 +766,83 @@ def search_spotify():
         query = data.get('query', '').strip()
         search_type = data.get('type')
         limit = min(data.get('limit', 10), 10)
+        fields = data.get('fields')
 
         if not query:
             return jsonify({'error': 'Query is required'}), 400
         
         if search_type not in ['artist', 'track']:
             return jsonify({'error': 'Invalid search type'}), 400
+
+        if fields is not None and not (isinstance(fields, list) and all(isinstance(field, str) and field for field in fields)):
+            return jsonify({'error': 'Fields must be a list of field paths'}), 400
         
-        # Make request to Spotify Search endpoint
-        search_url = 'https://api.spotify.com/v1/search'
-        headers = {'Authorization': f'Bearer {access_token}'}
-
-        params = {
-            'q': query,
-            'type': search_type,
-            'limit': limit
-        }
+        # Prefer the app token so cache misses don't spend the user's token
+        app_token = spotify.get_app_access_token()
+        search_token = app_token or access_token
 
         logger.debug(f'Searching Spotify for: "{query}" (type: {search_type}, limit: {limit})')
 
-        response = requests.get(search_url, headers=headers, params=params)
+        try:
+            # Results are cached and shared between all users, identical concurrent searches share one request
+            items = spotify.search_catalog(search_token, query, search_type, limit)
+        except spotify.SpotifyError as e:
+            if e.status_code != 401:
+                raise
 
-        if response.status_code == 401:
             # Token might be expired, try refreshing
             logger.debug('Token expired, attempting refresh')
-            new_token = verify_token()
+            new_token = spotify.get_app_access_token(refresh=True) if app_token else verify_token(force=True)
             if new_token:
-                headers = {'Authorization': f'Bearer {new_token}'}
-                response = requests.get(search_url, headers=headers, params=params)
+                items = spotify.search_catalog(new_token, query, search_type, limit)
             else:
                 logger.warning('Token refresh failed')
                 return jsonify({'error': 'Authentication failed'}), 401
-            
-        if response.status_code != 200:
-            logger.error(f'Spotify search failed: {response.status_code}, {response.text}')
-            return jsonify({'error': f'Spotify API error: {response.status_code}'}), response.status_code
-        
-        search_data = response.json()
-
-        # Extract relevant data based on search type
-        if search_type == 'artist':
-            items = search_data.get('artists', {}).get('items', [])
-        else:
-            items = search_data.get('tracks', {}).get('items', [])
 
         logger.debug(f'Found {len(items)} {search_type} results')
 
+        # Only send the requested fields, full items carry lists like available_markets that the page never uses
+        if fields:
+            field_tree = get_field_tree(fields)
+            items = [project_fields(item, field_tree) for item in items]
+
         return jsonify({
             'items': items,
             'total': len(items),
             'search_type': search_type,
             'query': query
         })
+
+    except spotify.SpotifyError as e:
+        logger.error(f'Spotify search failed: {str(e)}')
+        return jsonify({'error': str(e)}), e.status_code
     
     except Exception as e:
         logger.error(f'Error in search: {str(e)}')
         return jsonify({'error': str(e)}), 500
     
+# Turn dotted field paths like 'album.images.url' into a nested dict of the fields to keep
+def get_field_tree(fields: list) -> dict:
+    field_tree = {}
+    for field in fields:
+        node = field_tree
+        for name in field.split('.'):
+            node = node.setdefault(name, {})
+
+    return field_tree
+
+# Keep only the fields in the field tree, lists are projected item by item and fields missing from the value are skipped
+def project_fields(value, field_tree: dict):
+    if not field_tree:
+        return value
+
+    if isinstance(value, list):
+        return [project_fields(item, field_tree) for item in value]
+
+    if isinstance(value, dict):
+        return {name: project_fields(value[name], subtree) for name, subtree in field_tree.items() if name in value}
+
+    return value
+
 if __name__ == '__main__':
     app.run()
\ No newline at end of file
@@ -0,0 +1,57 @@
+import os
+import json
+import threading
+
+# Manifest written by scripts/build_assets.py, mapping static files to their content hashed copies in static/dist.
+# It's kept next to app.py since static/dist is left out of the serverless function bundle. Set ASSET_MANIFEST to an
+# empty string to serve the original files, e.g. while editing the CSS.
+ASSET_MANIFEST = os.environ.get('ASSET_MANIFEST', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'asset-manifest.json'))
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+# Precompressed copies in the order they're preferred, and the suffix of each
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+manifest = None
+manifest_lock = threading.Lock()
+
+# Load the manifest the first time it's needed, without one every file is served as is
+def get_manifest() -> dict:
+    global manifest
+
+    if manifest is None:
+        with manifest_lock:
+            if manifest is None:
+                manifest = load_manifest(ASSET_MANIFEST)
+
+    return manifest
+
+def load_manifest(path: str) -> dict:
+    if not path:
+        return {}
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f'Error loading asset manifest: {e}')
+        return {}
+
+# Get the hashed copy of a static file, or the file itself if it wasn't built
+def get_asset_path(filename: str) -> str:
+    return get_manifest().get('files', {}).get(filename, filename)
+
+# Get the resized copies of an image as {mimetype: [[width, path], ...]}, narrowest first
+def get_image_variants(filename: str) -> dict:
+    return get_manifest().get('images', {}).get(filename, {})
+
+# Get the best precompressed copy of a built file the client accepts, as (encoding, suffix)
+def get_encoding(path: str, accept_encodings) -> tuple:
+    encodings = get_manifest().get('encodings', {}).get(path, ())
+
+    for encoding, suffix in ENCODING_SUFFIXES.items():
+        if encoding in encodings and accept_encodings[encoding] > 0:
+            return encoding, suffix
+
+    return None, ''
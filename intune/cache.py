@@ -0,0 +1,419 @@
+import os
+import time
+import stat
+import pickle
+import hashlib
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Cache settings, 'memory' keeps entries in each process and 'sqlite' shares them between workers on one host. The
+# SQLite file goes in a directory only this user can access, see make_private_dir.
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'memory')
+CACHE_PATH = os.environ.get('CACHE_PATH', os.path.join(tempfile.gettempdir(), f'intune-{os.getuid()}', 'cache.db'))
+
+# Seconds between sweeps of expired entries out of in-process caches
+CACHE_SWEEP_INTERVAL = int(os.environ.get('CACHE_SWEEP_INTERVAL', 60))
+
+# Every cache and single flight group created by the app, used to report stats
+caches = []
+flight_groups = []
+
+# Estimate the memory footprint of a cached value using its pickled size
+def get_size(value) -> int:
+    return len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+
+# Create the directory of the SQLite file, private to this user. Entries are unpickled and hold access tokens, so a
+# directory someone else could plant or read files in, like a fixed name in the shared temp dir, is refused.
+def make_private_dir(path: str):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(f'Cache directory {directory} must be owned by this user with mode 0700.')
+
+# In-process cache with a time to live and least recently used eviction once the byte cap is reached
+class MemoryCache:
+    backend = 'memory'
+
+    def __init__(self, name: str, ttl: float, max_bytes: int):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict() # key -> (expires, size, value)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.next_sweep = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires, size, value = entry
+
+            if expires <= time.time():
+                self.remove(key)
+                self.misses += 1
+                return None
+
+            # Mark as most recently used
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        size = get_size(value)
+
+        # Values larger than the whole cache are never stored
+        if size > self.max_bytes:
+            return
+
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+            now = time.time()
+            self.entries[key] = (now + self.ttl, size, value)
+            self.total_bytes += size
+
+            # Drop expired entries every so often, otherwise ones that are never read again, like old sessions and
+            # their tokens, stay in memory until evicted
+            if now >= self.next_sweep:
+                self.sweep(now)
+
+            # Evict least recently used entries until back under the byte cap
+            while self.total_bytes > self.max_bytes:
+                oldest_key = next(iter(self.entries))
+                self.remove(oldest_key)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    # Remove an entry, caller must hold the lock
+    def remove(self, key):
+        _, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+    # Remove every expired entry, caller must hold the lock
+    def sweep(self, now: float):
+        for key in [key for key, (expires, _, _) in self.entries.items() if expires <= now]:
+            self.remove(key)
+
+        self.next_sweep = now + CACHE_SWEEP_INTERVAL
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'name': self.name,
+                'backend': self.backend,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# SQLite backed cache stored in a local file so every worker process on the host shares entries
+class SQLiteCache:
+    backend = 'sqlite'
+
+    def __init__(self, name: str, ttl: float, max_bytes: int, path: str = CACHE_PATH):
+        self.name = name
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+
+        make_private_dir(path)
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS cache ('
+                       'name TEXT, key TEXT, value BLOB, size INTEGER, expires REAL, accessed REAL, '
+                       'PRIMARY KEY (name, key))')
+
+    # SQLite connections can't be shared between threads, so keep one per thread
+    def connect(self) -> sqlite3.Connection:
+        db = getattr(self.local, 'db', None)
+
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            self.local.db = db
+
+        return db
+
+    def count(self, counter: str):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, key):
+        db = self.connect()
+        now = time.time()
+
+        row = db.execute('SELECT value, expires FROM cache WHERE name = ? AND key = ?', (self.name, repr(key))).fetchone()
+
+        if row is None or row[1] <= now:
+            self.count('misses')
+            return None
+
+        db.execute('UPDATE cache SET accessed = ? WHERE name = ? AND key = ?', (now, self.name, repr(key)))
+        self.count('hits')
+        return pickle.loads(row[0])
+
+    def set(self, key, value):
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+        if len(data) > self.max_bytes:
+            return
+
+        db = self.connect()
+        now = time.time()
+
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            db.execute('INSERT OR REPLACE INTO cache VALUES (?, ?, ?, ?, ?, ?)',
+                       (self.name, repr(key), data, len(data), now + self.ttl, now))
+
+            # Drop expired entries, then evict least recently used ones until back under the byte cap
+            db.execute('DELETE FROM cache WHERE name = ? AND expires <= ?', (self.name, now))
+            total_bytes = db.execute('SELECT COALESCE(SUM(size), 0) FROM cache WHERE name = ?', (self.name,)).fetchone()[0]
+
+            if total_bytes > self.max_bytes:
+                rows = db.execute('SELECT key, size FROM cache WHERE name = ? ORDER BY accessed', (self.name,)).fetchall()
+                for row_key, size in rows:
+                    if total_bytes <= self.max_bytes:
+                        break
+                    db.execute('DELETE FROM cache WHERE name = ? AND key = ?', (self.name, row_key))
+                    total_bytes -= size
+                    self.count('evictions')
+
+            db.execute('COMMIT')
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def delete(self, key):
+        self.connect().execute('DELETE FROM cache WHERE name = ? AND key = ?', (self.name, repr(key)))
+
+    def clear(self):
+        self.connect().execute('DELETE FROM cache WHERE name = ?', (self.name,))
+
+    def stats(self) -> dict:
+        entries, total_bytes = self.connect().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache WHERE name = ?', (self.name,)).fetchone()
+
+        return {
+            'name': self.name,
+            'backend': self.backend,
+            'entries': entries,
+            'bytes': total_bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+# Content addressed cache of byte blobs stored as files, evicting least recently used files once over the byte cap
+class DiskCache:
+    backend = 'disk'
+
+    def __init__(self, name: str, directory: str, max_bytes: int):
+        self.name = name
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def path(self, key) -> str:
+        return os.path.join(self.directory, hashlib.sha256(repr(key).encode()).hexdigest())
+
+    def get(self, key):
+        path = self.path(key)
+
+        try:
+            with open(path, 'rb') as file:
+                data = file.read()
+            os.utime(path) # Modified time is used as the last access time for eviction
+        except OSError:
+            with self.lock:
+                self.misses += 1
+            return None
+
+        with self.lock:
+            self.hits += 1
+        return data
+
+    def set(self, key, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+
+        # Write to a temp file and rename so readers never see a partial file
+        path = self.path(key)
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+        with open(temp_path, 'wb') as file:
+            file.write(data)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            self.total_bytes += len(data)
+            if self.total_bytes > self.max_bytes:
+                self.evict()
+
+    # Delete the oldest files until the directory is back under the byte cap, caller must hold the lock
+    def evict(self):
+        entries = sorted((entry for entry in os.scandir(self.directory) if entry.is_file()), key=lambda entry: entry.stat().st_mtime)
+        self.total_bytes = sum(entry.stat().st_size for entry in entries)
+
+        for entry in entries:
+            if self.total_bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+                self.total_bytes -= size
+                self.evictions += 1
+            except OSError:
+                pass
+
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self.lock:
+            for entry in os.scandir(self.directory):
+                if entry.is_file():
+                    os.remove(entry.path)
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'name': self.name,
+                'backend': self.backend,
+                'entries': sum(1 for entry in os.scandir(self.directory) if entry.is_file()),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+# A call that's in progress, shared by every caller asking for the same key
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+# Coalesces concurrent identical calls so only one runs and the rest wait for and share its result
+class SingleFlight:
+    def __init__(self, name: str):
+        self.name = name
+        self.flights = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.lock = threading.Lock()
+
+    def do(self, key, function, *args, **kwargs):
+        with self.lock:
+            flight = self.flights.get(key)
+
+            if flight is None:
+                leader = True
+                flight = Flight()
+                self.flights[key] = flight
+                self.calls += 1
+            else:
+                leader = False
+                self.coalesced += 1
+
+        # Followers wait for the leader and get its result, or its exception
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = function(*args, **kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                'name': self.name,
+                'calls': self.calls,
+                'coalesced': self.coalesced,
+                'in_flight': len(self.flights)
+            }
+
+# Create a named cache using the configured backend
+def create_cache(name: str, ttl: float, max_bytes: int, backend: str = None):
+    backend = backend or CACHE_BACKEND
+
+    if backend == 'sqlite':
+        new_cache = SQLiteCache(name, ttl, max_bytes)
+    elif backend == 'memory':
+        new_cache = MemoryCache(name, ttl, max_bytes)
+    else:
+        raise ValueError(f'Unknown cache backend: {backend}')
+
+    caches.append(new_cache)
+    return new_cache
+
+# Create a named file cache for byte blobs in the given directory
+def create_disk_cache(name: str, directory: str, max_bytes: int) -> DiskCache:
+    new_cache = DiskCache(name, directory, max_bytes)
+    caches.append(new_cache)
+    return new_cache
+
+# Create a named group for coalescing concurrent identical calls
+def create_single_flight(name: str) -> SingleFlight:
+    group = SingleFlight(name)
+    flight_groups.append(group)
+    return group
+
+# Get hit, miss and size stats for every cache, and call counts for every single flight group
+def get_stats() -> dict:
+    return {
+        'caches': [c.stats() for c in caches],
+        'single_flight': [group.stats() for group in flight_groups]
+    }
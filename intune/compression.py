@@ -0,0 +1,128 @@
+import os
+import zlib
+import threading
+
+# Text responses at least COMPRESS_MIN_BYTES long are compressed, smaller ones aren't worth the CPU or the header bytes.
+# Levels favor speed since responses are compressed on every request, prebuilt assets use the highest levels instead.
+COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 512))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 5))
+COMPRESS_MIMETYPES = {'text/html', 'text/css', 'text/plain', 'application/json', 'application/javascript', 'image/svg+xml'}
+
+brotli = None
+brotli_lock = threading.Lock()
+
+# Import brotli the first time it's needed, it's optional so gzip is used alone when it isn't installed
+def get_brotli():
+    global brotli
+
+    if brotli is None:
+        with brotli_lock:
+            if brotli is None:
+                try:
+                    import brotli as brotli_module
+                    brotli = brotli_module
+                except ImportError:
+                    brotli = False
+
+    return brotli
+
+# Incremental compressor for one response. Streamed responses flush after each chunk so the client can render
+# what's been sent so far.
+class Compressor:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+
+        if encoding == 'br':
+            self.compressor = get_brotli().Compressor(quality=BROTLI_QUALITY)
+        else:
+            # wbits of 16 + 15 writes a gzip header and trailer around the deflate stream
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data: bytes) -> bytes:
+        if self.encoding == 'br':
+            return self.compressor.process(data)
+        return self.compressor.compress(data)
+
+    def flush(self) -> bytes:
+        if self.encoding == 'br':
+            return self.compressor.flush()
+        return self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        if self.encoding == 'br':
+            return self.compressor.finish()
+        return self.compressor.flush()
+
+    # Compress a streamed body chunk by chunk, skipping empty output so the stream isn't padded with empty chunks
+    def stream(self, chunks):
+        try:
+            for chunk in chunks:
+                if isinstance(chunk, str):
+                    chunk = chunk.encode('utf-8')
+
+                data = self.compress(chunk) + self.flush()
+                if data:
+                    yield data
+
+            yield self.finish()
+        finally:
+            # Close the wrapped body too, streamed templates tear down their request context when closed
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+# Pick the encoding the client prefers out of the ones available, brotli first on a tie
+def get_encoding(accept_encodings) -> str:
+    encodings = ['br', 'gzip'] if get_brotli() else ['gzip']
+    encoding = accept_encodings.best_match(encodings)
+
+    return encoding if encoding and accept_encodings[encoding] > 0 else None
+
+# Whether a response is text that hasn't been compressed yet. Files are skipped, send_file responses are either
+# prebuilt assets with their own compressed copies or images.
+def should_compress(response) -> bool:
+    return (
+        200 <= response.status_code < 300
+        and response.status_code not in (204, 206)
+        and response.mimetype in COMPRESS_MIMETYPES
+        and 'Content-Encoding' not in response.headers
+        and not response.direct_passthrough
+        and 'no-transform' not in response.headers.get('Cache-Control', '')
+    )
+
+# Compress a response with brotli or gzip when the client accepts it. Buffered bodies under COMPRESS_MIN_BYTES are
+# left alone, streamed bodies are always compressed since their size isn't known up front.
+def compress_response(response, accept_encodings):
+
+    if not should_compress(response):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = get_encoding(accept_encodings)
+    if not encoding:
+        return response
+
+    compressor = Compressor(encoding)
+
+    if response.is_streamed:
+        response.response = compressor.stream(response.response)
+        response.headers.pop('Content-Length', None)
+    else:
+        body = response.get_data()
+        if len(body) < COMPRESS_MIN_BYTES:
+            return response
+
+        data = compressor.compress(body) + compressor.finish()
+        if len(data) >= len(body):
+            return response
+
+        response.set_data(data)
+
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed body is a different representation, so a strong ETag of the original no longer matches it
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
@@ -1,100 +1,157 @@
 import os
-import requests
-import pandas as pd
+import time
+import cache
+import hashlib
+import spotify
+import threading
 from io import BytesIO
 from PIL import Image, ImageDraw, ImageFont
+from concurrent.futures import ThreadPoolExecutor, wait
 
-def create_share_image(final_artists: pd.DataFrame, final_tracks: pd.DataFrame, total_artists: int, total_tracks: int, time_range: str = 'short_term') -> BytesIO:
+# Artwork is downloaded in parallel, anything not downloaded by the deadline is drawn without an image
+ARTWORK_WORKERS = int(os.environ.get('ARTWORK_WORKERS', 10))
+ARTWORK_DEADLINE = float(os.environ.get('ARTWORK_DEADLINE', 3))
 
-    width, height = 1080, 1920
-    image = Image.new('RGB', (width, height), color='#191414')
-    draw = ImageDraw.Draw(image)
-    
-    try:
-        app_root = os.path.dirname(os.path.abspath(__file__))
-        
-        title_font = ImageFont.truetype(os.path.join(app_root, 'static/fonts/Montserrat-Bold.ttf'), 48)
-        section_font = ImageFont.truetype(os.path.join(app_root, 'static/fonts/Montserrat-SemiBold.ttf'), 42)
-        item_font = ImageFont.truetype(os.path.join(app_root, 'static/fonts/Montserrat-Medium.ttf'), 36)
-        small_font = ImageFont.truetype(os.path.join(app_root, 'static/fonts/Montserrat-Regular.ttf'), 28)
-        
-    except Exception as e:
-        print(f'Font loading failed: {e}')
-        try:
-            # Try system fonts first
-            title_font = ImageFont.truetype('arial.ttf', 48)
-            section_font = ImageFont.truetype('arial.ttf', 42)
-            item_font = ImageFont.truetype('arial.ttf', 36)
-            small_font = ImageFont.truetype('arial.ttf', 28)
-        except:
-            # Final fallback to default
-            title_font = ImageFont.load_default()
-            section_font = ImageFont.load_default()
-            item_font = ImageFont.load_default()
-            small_font = ImageFont.load_default()
-    
-    # Colors
-    spotify_green = '#1DB954'
-    white = '#FFFFFF'
-    gray = '#B3B3B3'
-    
-    # Add InTune logo
-    try:
-        logo = Image.open('static/images/intune.png')
-        logo_size = 150
-        logo = logo.resize((logo_size, logo_size), Image.Resampling.LANCZOS)
+# Resized artwork thumbnails are cached in memory, and on disk when a cache directory is configured
+ARTWORK_SIZE = 125
+ARTWORK_CACHE_TTL = int(os.environ.get('ARTWORK_CACHE_TTL', 7 * 24 * 60 * 60))
+ARTWORK_CACHE_BYTES = int(os.environ.get('ARTWORK_CACHE_BYTES', 32 * 1024 * 1024))
+ARTWORK_CACHE_DIR = os.environ.get('ARTWORK_CACHE_DIR')
+ARTWORK_DISK_CACHE_BYTES = int(os.environ.get('ARTWORK_DISK_CACHE_BYTES', 256 * 1024 * 1024))
 
-        # Paste logo in top left corner
-        image.paste(logo, (25, 25), logo if logo.mode == 'RGBA' else None)
-    except Exception as e:
-        print(f'Could not load logo: {e}')
+artwork_cache = cache.create_cache('artwork', ARTWORK_CACHE_TTL, ARTWORK_CACHE_BYTES, backend='memory')
+artwork_disk_cache = cache.create_disk_cache('artwork_disk', ARTWORK_CACHE_DIR, ARTWORK_DISK_CACHE_BYTES) if ARTWORK_CACHE_DIR else None
+
+# Rendered stories are cached under a hash of their inputs, bump the version whenever the layout changes
+STORY_VERSION = 1
+STORY_CACHE_TTL = int(os.environ.get('STORY_CACHE_TTL', 60 * 60))
+STORY_CACHE_BYTES = int(os.environ.get('STORY_CACHE_BYTES', 64 * 1024 * 1024))
+
+story_cache = cache.create_cache('stories', STORY_CACHE_TTL, STORY_CACHE_BYTES)
+
+# Output formats for stories as (Pillow format, mimetype, file extension), with tunable encoder settings
+STORY_FORMATS = {
+    'png': ('PNG', 'image/png', 'png'),
+    'jpeg': ('JPEG', 'image/jpeg', 'jpg'),
+    'webp': ('WEBP', 'image/webp', 'webp')
+}
+DEFAULT_STORY_FORMAT = 'png'
+PNG_COMPRESS_LEVEL = int(os.environ.get('STORY_PNG_COMPRESS_LEVEL', 6))
+JPEG_QUALITY = int(os.environ.get('STORY_JPEG_QUALITY', 90))
+WEBP_QUALITY = int(os.environ.get('STORY_WEBP_QUALITY', 90))
+WEBP_METHOD = int(os.environ.get('STORY_WEBP_METHOD', 4))
+
+# Story canvas size and colors
+STORY_WIDTH, STORY_HEIGHT = 1080, 1920
+BACKGROUND_COLOR = '#191414'
+SPOTIFY_GREEN = '#1DB954'
+WHITE = '#FFFFFF'
+GRAY = '#B3B3B3'
+TOP_ARTISTS_Y = 215
+
+# Header text and font for each time range
+HEADERS = {
+    'short_term': ('My Last Month of Listening', 'title_font'),
+    'medium_term': ('My Last 6 Months of Listening', 'section_font'),
+    'long_term': ('My Last Year of Listening', 'title_font')
+}
+DEFAULT_HEADER = ('My Top Listening', 'title_font')
+
+# Story fonts and logo, resolved from this module's location so they load from any working directory
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+FONT_FILES = {
+    'title_font': ('static/fonts/Montserrat-Bold.ttf', 48),
+    'section_font': ('static/fonts/Montserrat-SemiBold.ttf', 42),
+    'item_font': ('static/fonts/Montserrat-Medium.ttf', 36),
+    'small_font': ('static/fonts/Montserrat-Regular.ttf', 28)
+}
+FALLBACK_FONT = 'arial.ttf'
+LOGO_FILE = 'static/images/intune.png'
+LOGO_SIZE = 150
+
+executor = None
+executor_lock = threading.Lock()
+assets = None
+assets_lock = threading.Lock()
+base_layers = {}
+base_layers_lock = threading.Lock()
+
+# Get a hash of every input that affects the rendered story, used as its cache key and ETag
+def get_story_key(final_artists: list, final_tracks: list, total_artists: int, total_tracks: int, time_range: str = 'short_term', theme: str = 'default', output_format: str = DEFAULT_STORY_FORMAT) -> str:
+
+    artists = [(artist.id, artist.name, artist.image) for artist in final_artists[:5]]
+    tracks = [(track.id, track.name, track.artists, track.image) for track in final_tracks[:5]]
+    inputs = (STORY_VERSION, artists, tracks, total_artists, total_tracks, time_range, theme, output_format)
+
+    return hashlib.sha256(repr(inputs).encode()).hexdigest()
 
-    # Determine header text and font size based on time range
-    if time_range == 'short_term':
-        header_text = 'My Last Month of Listening'
-        header_font = title_font
-    elif time_range == 'medium_term':
-        header_text = 'My Last 6 Months of Listening'
-        header_font = section_font
-    elif time_range == 'long_term':
-        header_text = 'My Last Year of Listening'
-        header_font = title_font
-    else:
-        header_text = 'My Top Listening'
-        header_font = title_font
+# Get the encoded story, reusing a cached render with the same inputs, and whether the render is complete
+def get_story_image(final_artists: list, final_tracks: list, total_artists: int, total_tracks: int, time_range: str = 'short_term', theme: str = 'default', output_format: str = DEFAULT_STORY_FORMAT, key: str = None) -> tuple[bytes, bool]:
+
+    key = key or get_story_key(final_artists, final_tracks, total_artists, total_tracks, time_range, theme, output_format)
+
+    image_bytes = story_cache.get(key)
+    if image_bytes is not None:
+        return image_bytes, True
+
+    artwork_urls = get_artwork_urls(final_artists, final_tracks)
+    artwork = download_images(artwork_urls, ARTWORK_DEADLINE)
+
+    img_buffer = create_share_image(final_artists, final_tracks, total_artists, total_tracks, time_range, theme, artwork, output_format)
+    image_bytes = img_buffer.getvalue()
+
+    # Only cache complete renders, so artwork that missed the deadline is tried again next time
+    complete = all(artwork.get(url) for url in artwork_urls)
+    if complete:
+        story_cache.set(key, image_bytes)
+
+    return image_bytes, complete
+
+# Draw the story and encode it in the requested output format
+def create_share_image(final_artists: list, final_tracks: list, total_artists: int, total_tracks: int, time_range: str = 'short_term', theme: str = 'default', artwork: dict = None, output_format: str = DEFAULT_STORY_FORMAT) -> BytesIO:
+
+    image = draw_share_image(final_artists, final_tracks, total_artists, total_tracks, time_range, theme, artwork)
+    return encode_image(image, output_format)
+
+# Draw the story image for the user's top artists and tracks
+def draw_share_image(final_artists: list, final_tracks: list, total_artists: int, total_tracks: int, time_range: str = 'short_term', theme: str = 'default', artwork: dict = None) -> Image.Image:
+
+    # Start from a copy of the prebuilt layer with everything that's the same for every user
+    image = get_base_layer(time_range, theme).copy()
+    draw = ImageDraw.Draw(image)
     
-    # Header section
-    draw.text((540, 100), header_text, font=header_font, fill=white, anchor='mm')
+    # Fonts and logo are loaded once per process
+    assets = get_assets()
+    section_font = assets['section_font']
+    item_font = assets['item_font']
+    small_font = assets['small_font']
+
+    # Download all artwork at once before drawing starts, unless it was already downloaded
+    if artwork is None:
+        artwork = download_images(get_artwork_urls(final_artists, final_tracks), ARTWORK_DEADLINE)
     
-    # Top artists section
-    y_offset = 215
-    draw.text((200, y_offset), 'Top Artists', font=section_font, fill=spotify_green, anchor='mm')
-    draw.text((825, y_offset), f'{total_artists} Total Artists', font=section_font, fill=spotify_green, anchor='mm')
+    # Top artists section, the heading is part of the base layer
+    y_offset = TOP_ARTISTS_Y
+    draw.text((825, y_offset), f'{total_artists} Total Artists', font=section_font, fill=SPOTIFY_GREEN, anchor='mm')
     y_offset += 50
 
     # Add top 5 artists with images
-    for i, artist in enumerate(final_artists.head(5).iterrows()):
-
-        artist_data = artist[1]
+    for i, artist_data in enumerate(final_artists[:5]):
 
-        if not str(artist_data['id']).startswith('placeholder'):
+        if not artist_data.is_placeholder:
 
             # Truncate long artist names
-            artist_name = artist_data['name']
+            artist_name = artist_data.name
             if len(artist_name) > 45:
                 artist_name = artist_name[:42] + '...'
             
             # Try to load and display artist image
             artist_image = None
-            if artist_data.get('image'):
-                artist_image = download_image_from_url(artist_data['image'])
+            if artist_data.image:
+                artist_image = artwork.get(artist_data.image)
             
             if artist_image:
 
-                # Resize artist image
-                img_size = 125
-                artist_image = artist_image.resize((img_size, img_size), Image.Resampling.LANCZOS)
-                
                 # Paste square artist image
                 image.paste(artist_image, (80, y_offset))
                 
@@ -106,25 +163,23 @@ def create_share_image(final_artists: pd.DataFrame, final_tracks: pd.DataFrame,
                 number_x = 100
                 text_x = 150
             
-            draw.text((number_x, y_offset + 40), f'{i+1}.', font=item_font, fill=gray)
-            draw.text((text_x, y_offset + 40), artist_name, font=item_font, fill=white)
+            draw.text((number_x, y_offset + 40), f'{i+1}.', font=item_font, fill=GRAY)
+            draw.text((text_x, y_offset + 40), artist_name, font=item_font, fill=WHITE)
             y_offset += 150 # Padding between items
     
     # Top tracks section
     y_offset += 25
-    draw.text((200, y_offset), 'Top Tracks', font=section_font, fill=spotify_green, anchor='mm')
-    draw.text((825, y_offset), f'{total_tracks} Total Tracks', font=section_font, fill=spotify_green, anchor='mm')
+    draw.text((200, y_offset), 'Top Tracks', font=section_font, fill=SPOTIFY_GREEN, anchor='mm')
+    draw.text((825, y_offset), f'{total_tracks} Total Tracks', font=section_font, fill=SPOTIFY_GREEN, anchor='mm')
     y_offset += 50
 
     # Add top 5 tracks with album art
-    for i, track in enumerate(final_tracks.head(5).iterrows()):
+    for i, track_data in enumerate(final_tracks[:5]):
 
-        track_data = track[1]
+        if not track_data.is_placeholder:
 
-        if not str(track_data['id']).startswith('placeholder'):
-
-            track_name = track_data['name']
-            artists = track_data['artists']
+            track_name = track_data.name
+            artists = track_data.artists
             
             # Format artist names
             if isinstance(artists, list):
@@ -134,15 +189,11 @@ def create_share_image(final_artists: pd.DataFrame, final_tracks: pd.DataFrame,
             
             # Try to load and display album art
             album_image = None
-            if track_data.get('image'):
-                album_image = download_image_from_url(track_data['image'])
+            if track_data.image:
+                album_image = artwork.get(track_data.image)
             
             if album_image:
 
-                # Resize album art
-                img_size = 125
-                album_image = album_image.resize((img_size, img_size), Image.Resampling.LANCZOS)
-                
                 # Paste square album art
                 image.paste(album_image, (80, y_offset))
                 
@@ -161,27 +212,214 @@ def create_share_image(final_artists: pd.DataFrame, final_tracks: pd.DataFrame,
                 artist_names = artist_names[:47] + '...'
             
             # Draw track number, name, and artists
-            draw.text((number_x, y_offset + 40), f'{i+1}.', font=item_font, fill=gray)
-            draw.text((text_x, y_offset + 25), track_name, font=item_font, fill=white)
-            draw.text((text_x, y_offset + 65), artist_names, font=small_font, fill=gray)
+            draw.text((number_x, y_offset + 40), f'{i+1}.', font=item_font, fill=GRAY)
+            draw.text((text_x, y_offset + 25), track_name, font=item_font, fill=WHITE)
+            draw.text((text_x, y_offset + 65), artist_names, font=small_font, fill=GRAY)
             y_offset += 150 # Padding between items
     
-    # Footer section
-    footer_y = height - 75
-    draw.text((540, footer_y), 'Created with InTune', font=small_font, fill=gray, anchor='mm')
-    draw.text((540, footer_y + 40), 'https://in-tune.app', font=small_font, fill=spotify_green, anchor='mm')
-    
+    return image
+
+# Encode an image in one of the story output formats
+def encode_image(image: Image.Image, output_format: str = DEFAULT_STORY_FORMAT, **options) -> BytesIO:
+
+    pillow_format = STORY_FORMATS[output_format][0]
+
+    # Only pass the settings each encoder understands, quality has no effect on PNG
+    if output_format == 'png':
+        options.setdefault('compress_level', PNG_COMPRESS_LEVEL)
+    elif output_format == 'jpeg':
+        options.setdefault('quality', JPEG_QUALITY)
+        options.setdefault('optimize', True)
+    elif output_format == 'webp':
+        options.setdefault('quality', WEBP_QUALITY)
+        options.setdefault('method', WEBP_METHOD)
+
     # Save image to buffer
     img_buffer = BytesIO()
-    image.save(img_buffer, format='PNG', quality=95)
+    image.save(img_buffer, format=pillow_format, **options)
     img_buffer.seek(0)
     return img_buffer
 
-def download_image_from_url(url):
+# Get the fonts and logo used to draw stories, loading them on first use
+def get_assets() -> dict:
+    global assets
+
+    if assets is None:
+        with assets_lock:
+            if assets is None:
+                assets = load_assets()
+
+    return assets
+
+# Load story fonts, falling back to system then default fonts, and the resized logo
+def load_assets() -> dict:
+
+    loaded_assets = {}
+
+    try:
+        for name, (path, size) in FONT_FILES.items():
+            loaded_assets[name] = ImageFont.truetype(os.path.join(APP_ROOT, path), size)
+    except Exception as e:
+        print(f'Font loading failed: {e}')
+        try:
+            # Try system fonts first
+            for name, (_, size) in FONT_FILES.items():
+                loaded_assets[name] = ImageFont.truetype(FALLBACK_FONT, size)
+        except:
+            # Final fallback to default
+            for name in FONT_FILES:
+                loaded_assets[name] = ImageFont.load_default()
+
+    try:
+        logo = Image.open(os.path.join(APP_ROOT, LOGO_FILE))
+        loaded_assets['logo'] = logo.resize((LOGO_SIZE, LOGO_SIZE), Image.Resampling.LANCZOS)
+    except Exception as e:
+        print(f'Could not load logo: {e}')
+        loaded_assets['logo'] = None
+
+    return loaded_assets
+
+# Get the prebuilt story background for a time range and theme, building it on first use
+def get_base_layer(time_range: str, theme: str = 'default') -> Image.Image:
+
+    # Unknown time ranges all share the default header, so they share a layer too
+    key = (time_range if time_range in HEADERS else None, theme)
+
+    base_layer = base_layers.get(key)
+    if base_layer is None:
+        with base_layers_lock:
+            base_layer = base_layers.get(key)
+            if base_layer is None:
+                base_layer = build_base_layer(time_range)
+                base_layers[key] = base_layer
+
+    return base_layer
+
+# Draw the parts of the story that are the same for every user: background, logo, header, headings and footer
+def build_base_layer(time_range: str) -> Image.Image:
+
+    image = Image.new('RGB', (STORY_WIDTH, STORY_HEIGHT), color=BACKGROUND_COLOR)
+    draw = ImageDraw.Draw(image)
+    assets = get_assets()
+
+    # Add InTune logo
+    logo = assets['logo']
+    if logo:
+
+        # Paste logo in top left corner
+        image.paste(logo, (25, 25), logo if logo.mode == 'RGBA' else None)
+
+    # Header section, text and font size are based on time range
+    header_text, header_font = HEADERS.get(time_range, DEFAULT_HEADER)
+    draw.text((540, 100), header_text, font=assets[header_font], fill=WHITE, anchor='mm')
+
+    # Top artists heading always sits at the same height
+    draw.text((200, TOP_ARTISTS_Y), 'Top Artists', font=assets['section_font'], fill=SPOTIFY_GREEN, anchor='mm')
+
+    # Footer section
+    footer_y = STORY_HEIGHT - 75
+    draw.text((540, footer_y), 'Created with InTune', font=assets['small_font'], fill=GRAY, anchor='mm')
+    draw.text((540, footer_y + 40), 'https://in-tune.app', font=assets['small_font'], fill=SPOTIFY_GREEN, anchor='mm')
+
+    return image
+
+# Get the image URLs of the artists and tracks drawn on the story
+def get_artwork_urls(final_artists: list, final_tracks: list) -> list:
+    return [item.image for item in final_artists[:5] + final_tracks[:5] if not item.is_placeholder and item.image]
+
+# Get the shared thread pool used for artwork downloads, creating it on first use
+def get_executor() -> ThreadPoolExecutor:
+    global executor
+
+    if executor is None:
+        with executor_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=ARTWORK_WORKERS, thread_name_prefix='artwork')
+
+    return executor
+
+# Get thumbnails for several images, downloading cache misses concurrently until the deadline
+def download_images(urls: list, deadline: float) -> dict:
+
+    deadline_time = time.monotonic() + deadline
+
+    images = {}
+    futures = {}
+    for url in set(urls):
+        thumbnail = get_cached_thumbnail(url)
+        if thumbnail:
+            images[url] = thumbnail
+        else:
+            futures[url] = get_executor().submit(download_thumbnail, url, deadline)
+
+    wait(futures.values(), timeout=max(0, deadline_time - time.monotonic()))
+
+    # Downloads that failed in any way are treated as missing artwork, so the story still renders
+    for url, future in futures.items():
+        if future.done():
+            try:
+                images[url] = future.result()
+            except Exception as e:
+                print(f'Error getting artwork for {url}: {e}')
+        else:
+            future.cancel()
+
+    return images
+
+# Get an already resized thumbnail from the memory cache, falling back to the disk cache
+def get_cached_thumbnail(url: str):
+
+    # Artwork URLs are content addressed by Spotify, so the URL and size identify the thumbnail
+    key = (url, ARTWORK_SIZE)
+
+    cached_thumbnail = artwork_cache.get(key)
+    if cached_thumbnail:
+        mode, size, data = cached_thumbnail
+        return Image.frombytes(mode, size, data)
+
+    if artwork_disk_cache:
+        data = artwork_disk_cache.get(key)
+        if data:
+            try:
+                thumbnail = Image.open(BytesIO(data))
+                thumbnail.load()
+                artwork_cache.set(key, (thumbnail.mode, thumbnail.size, thumbnail.tobytes()))
+                return thumbnail
+            except Exception:
+                artwork_disk_cache.delete(key)
+
+    return None
+
+# Download an image, resize it to thumbnail size and store it in the caches
+def download_thumbnail(url: str, timeout=5):
+
+    image = download_image_from_url(url, timeout)
+    if not image:
+        return None
+
+    thumbnail = image.convert('RGB').resize((ARTWORK_SIZE, ARTWORK_SIZE), Image.Resampling.LANCZOS)
+    key = (url, ARTWORK_SIZE)
+
+    # Caching is best effort, a full or read only disk shouldn't lose the downloaded thumbnail
+    try:
+        artwork_cache.set(key, (thumbnail.mode, thumbnail.size, thumbnail.tobytes()))
+
+        if artwork_disk_cache:
+            buffer = BytesIO()
+            thumbnail.save(buffer, format='PNG', compress_level=1)
+            artwork_disk_cache.set(key, buffer.getvalue())
+    except Exception as e:
+        print(f'Error caching artwork for {url}: {e}')
+
+    return thumbnail
+
+def download_image_from_url(url, timeout=5):
     try:
-        response = requests.get(url, timeout=5)
+        response = spotify.get_client().get(url, timeout=timeout)
         if response.status_code == 200:
-            return Image.open(BytesIO(response.content))
+            image = Image.open(BytesIO(response.content))
+            image.load() # Decode here so it happens in parallel with the other downloads
+            return image
     except:
         pass
     return None
\ No newline at end of file
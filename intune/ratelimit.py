@@ -0,0 +1,137 @@
+import os
+import time
+import cache
+import sqlite3
+import threading
+
+# Client side request budget for the whole app, shared by every thread and, with the sqlite backend, every worker
+RATE_LIMIT_PER_SECOND = float(os.environ.get('SPOTIFY_RATE_LIMIT_PER_SECOND', 10))
+RATE_LIMIT_BURST = float(os.environ.get('SPOTIFY_RATE_LIMIT_BURST', 20))
+RATE_LIMIT_BACKEND = os.environ.get('SPOTIFY_RATE_LIMIT_BACKEND', cache.CACHE_BACKEND)
+
+# The bucket is paused for longer than a request is willing to wait, e.g. after a 429 with a long Retry-After
+class BucketPaused(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f'Rate limit paused for {retry_after:.1f} seconds')
+        self.retry_after = retry_after
+
+# Token bucket that refills at a fixed rate up to a burst capacity, and can be paused after a 429
+class TokenBucket:
+    backend = 'memory'
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.time()
+        self.paused_until = 0
+        self.lock = threading.Lock()
+
+    # Take a token if one is available, otherwise return how long to wait before trying again and whether that's
+    # because the bucket is paused
+    def try_acquire(self) -> tuple[float, bool]:
+        with self.lock:
+            now = time.time()
+
+            if now < self.paused_until:
+                return self.paused_until - now, True
+
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0, False
+
+            return (1 - self.tokens) / self.rate, False
+
+    # Stop handing out tokens for a while, used when Spotify asks us to back off
+    def pause(self, seconds: float):
+        with self.lock:
+            self.paused_until = max(self.paused_until, time.time() + seconds)
+            self.tokens = 0
+
+    # Wait for a token, giving up after max_wait so a busy bucket slows requests down without failing them. A pause
+    # that outlasts max_wait raises BucketPaused right away, sending the request would only get another 429.
+    def acquire(self, max_wait: float) -> float:
+        waited = 0
+
+        while True:
+            wait, paused = self.try_acquire()
+            if paused and wait > max_wait - waited:
+                raise BucketPaused(wait)
+
+            if wait <= 0 or waited >= max_wait:
+                return waited
+
+            wait = min(wait, max_wait - waited)
+            time.sleep(wait)
+            waited += wait
+
+# Token bucket kept in the local SQLite cache file so every worker process on the host shares one budget
+class SQLiteTokenBucket(TokenBucket):
+    backend = 'sqlite'
+
+    def __init__(self, rate: float, capacity: float, name: str = 'spotify', path: str = cache.CACHE_PATH):
+        super().__init__(rate, capacity)
+        self.name = name
+        self.path = path
+        self.local = threading.local()
+
+        cache.make_private_dir(path)
+        with self.connect() as db:
+            db.execute('CREATE TABLE IF NOT EXISTS token_buckets ('
+                       'name TEXT PRIMARY KEY, tokens REAL, updated REAL, paused_until REAL)')
+            db.execute('INSERT OR IGNORE INTO token_buckets VALUES (?, ?, ?, 0)', (name, capacity, time.time()))
+
+    # SQLite connections can't be shared between threads, so keep one per thread
+    def connect(self) -> sqlite3.Connection:
+        db = getattr(self.local, 'db', None)
+
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            db.execute('PRAGMA journal_mode=WAL')
+            self.local.db = db
+
+        return db
+
+    def try_acquire(self) -> tuple[float, bool]:
+        db = self.connect()
+
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            now = time.time()
+            tokens, updated, paused_until = db.execute(
+                'SELECT tokens, updated, paused_until FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+
+            if now < paused_until:
+                db.execute('COMMIT')
+                return paused_until - now, True
+
+            tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            if tokens >= 1:
+                tokens -= 1
+
+            db.execute('UPDATE token_buckets SET tokens = ?, updated = ? WHERE name = ?', (tokens, now, self.name))
+            db.execute('COMMIT')
+            return wait, False
+        except Exception:
+            db.execute('ROLLBACK')
+            raise
+
+    def pause(self, seconds: float):
+        self.connect().execute(
+            'UPDATE token_buckets SET tokens = 0, paused_until = MAX(paused_until, ?) WHERE name = ?',
+            (time.time() + seconds, self.name))
+
+# Create the request budget using the configured backend
+def create_bucket(rate: float = RATE_LIMIT_PER_SECOND, capacity: float = RATE_LIMIT_BURST, backend: str = None) -> TokenBucket:
+    backend = backend or RATE_LIMIT_BACKEND
+
+    if backend == 'sqlite':
+        return SQLiteTokenBucket(rate, capacity)
+    elif backend == 'memory':
+        return TokenBucket(rate, capacity)
+    else:
+        raise ValueError(f'Unknown rate limit backend: {backend}')
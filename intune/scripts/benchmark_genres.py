@@ -0,0 +1,81 @@
+import os
+import sys
+import time
+import random
+import argparse
+import statistics
+from collections import Counter
+
+# Run from anywhere by importing the app modules from the directory above
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_ROOT)
+
+import spotify
+import analytics
+
+# Build top artists and tracks with genres drawn from a fixed pool, so runs are repeatable
+def build_fixture(limit: int, genre_pool: int, seed: int = 1) -> tuple[list, list, dict]:
+
+    rng = random.Random(seed)
+    genres = [f'genre {i}' for i in range(genre_pool)]
+
+    artists = []
+    for i in range(limit):
+        artists.append(spotify.Artist(f'artist-{i}', f'Artist {i}', rng.sample(genres, rng.randint(0, 6)), 50, '1,000', '#'))
+
+    tracks = []
+    artist_genres = {}
+    for i in range(limit):
+        artist_ids = [f'track-artist-{i}-{j}' for j in range(rng.randint(1, 3))]
+        for artist_id in artist_ids:
+            artist_genres[artist_id] = rng.sample(genres, rng.randint(0, 6))
+        tracks.append(spotify.Track(f'track-{i}', f'Track {i}', ['Artist'], '1/1/2024', 50, '#', None, artist_ids))
+
+    return artists, tracks, artist_genres
+
+# Previous approach, a Counter over every genre string with float weights, then a scan for the max and a sort
+def counter_genres(artists: list, tracks: list, artist_genres: dict) -> list:
+
+    genre_weights = Counter(genre for artist in artists for genre in artist.genres)
+
+    for track in tracks:
+        for artist_id in track.artist_ids:
+            for genre in artist_genres.get(artist_id, []):
+                genre_weights[genre] += 1 / len(track.artist_ids)
+
+    genre_weights = Counter({genre: round(weight, 6) for genre, weight in genre_weights.items()})
+    max_count = max(genre_weights.values(), default=0)
+    return sorted(genre for genre, count in genre_weights.items() if count == max_count)
+
+def analytics_genres(artists: list, tracks: list, artist_genres: dict) -> list:
+    return analytics.analyze_genres(artists, tracks, artist_genres).top_genres
+
+# Time a function over many runs and return the median in microseconds
+def time_function(function, runs: int, *args) -> float:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        function(*args)
+        timings.append((time.perf_counter() - start) * 1000000)
+
+    return statistics.median(timings)
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description='Compare genre counting approaches on fixture data.')
+    parser.add_argument('--runs', type=int, default=200, help='Number of runs per case, the median is reported')
+    parser.add_argument('--genres', type=int, default=300, help='Number of distinct genres in the fixture pool')
+    args = parser.parse_args()
+
+    print(f'{"items":>6} {"counter us":>12} {"analytics us":>14}')
+    for limit in (10, 50, 200):
+        fixture = build_fixture(limit, args.genres)
+
+        counter_us = time_function(counter_genres, args.runs, *fixture)
+        analytics_us = time_function(analytics_genres, args.runs, *fixture)
+        print(f'{limit:>6} {counter_us:>12.1f} {analytics_us:>14.1f}')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,75 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import statistics
+
+# Run from anywhere by importing the app modules from the directory above
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP_ROOT)
+
+import spotify
+import image_generator
+from PIL import Image
+
+# Encoder settings compared by the benchmark as (format, options)
+VARIANTS = [
+    ('png', {'compress_level': 1}),
+    ('png', {'compress_level': 3}),
+    ('png', {'compress_level': 6}),
+    ('png', {'compress_level': 9}),
+    ('jpeg', {'quality': 80, 'optimize': True}),
+    ('jpeg', {'quality': 90, 'optimize': True}),
+    ('webp', {'quality': 80, 'method': 4}),
+    ('webp', {'quality': 90, 'method': 4}),
+    ('webp', {'quality': 90, 'method': 6})
+]
+
+# Build a story from fixture records, using the background photos in static/images as artwork
+def build_fixture_story(time_range: str) -> Image.Image:
+
+    photos = sorted(glob.glob(os.path.join(APP_ROOT, 'static/images/bg*.jpg')))
+
+    artists = []
+    tracks = []
+    artwork = {}
+    for i in range(5):
+        artist_image = f'fixture://artist/{i}'
+        track_image = f'fixture://track/{i}'
+
+        artists.append(spotify.Artist(f'artist-{i}', f'Fixture Artist Number {i + 1}', ['pop'], 50, '1,000', '#', artist_image))
+        tracks.append(spotify.Track(f'track-{i}', f'Fixture Track With A Longer Name {i + 1}', ['Fixture Artist', 'Featured Artist'], '1/1/2024', 50, '#', track_image))
+
+        for j, url in enumerate((artist_image, track_image)):
+            if photos:
+                photo = Image.open(photos[(i * 2 + j) % len(photos)]).convert('RGB')
+                artwork[url] = photo.resize((image_generator.ARTWORK_SIZE, image_generator.ARTWORK_SIZE), Image.Resampling.LANCZOS)
+
+    return image_generator.draw_share_image(artists, tracks, '1,234', '5,678', time_range, artwork=artwork)
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description='Compare encode time and size of story output formats.')
+    parser.add_argument('--runs', type=int, default=5, help='Number of encodes per variant, the median is reported')
+    parser.add_argument('--time-range', default='short_term', help='Time range used for the story header')
+    args = parser.parse_args()
+
+    image = build_fixture_story(args.time_range)
+
+    print(f'{"format":<6} {"settings":<32} {"encode ms":>10} {"size KB":>10}')
+    for output_format, options in VARIANTS:
+        timings = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            img_buffer = image_generator.encode_image(image, output_format, **options)
+            timings.append((time.perf_counter() - start) * 1000)
+
+        settings = ', '.join(f'{key}={value}' for key, value in options.items())
+        size_kb = len(img_buffer.getvalue()) / 1024
+        print(f'{output_format:<6} {settings:<32} {statistics.median(timings):>10.1f} {size_kb:>10.1f}')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
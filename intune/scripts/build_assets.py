@@ -0,0 +1,195 @@
+import os
+import re
+import sys
+import gzip
+import json
+import shutil
+import hashlib
+import argparse
+from io import BytesIO
+
+# Run from anywhere, assets are read from and written to the static folder next to app.py
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STATIC_ROOT = os.path.join(APP_ROOT, 'static')
+DIST_DIR = 'dist'
+
+MANIFEST_PATH = os.path.join(APP_ROOT, 'asset-manifest.json')
+
+# Folders that get content hashed copies, favicons keep their names since site.webmanifest and browsers ask for them directly
+HASHED_DIRS = ['fonts', 'images', 'js', 'css']
+COMPRESSED_EXTENSIONS = ('.css', '.js')
+
+# Background images get resized copies in each modern format, so phones don't download a 2 MB photo. The full size
+# JPEGs are only a fallback for old browsers, so they're served from their original path instead of being copied.
+BACKGROUND_PATTERN = re.compile(r'images/bg\d+\.jpg$')
+BACKGROUND_WIDTHS = [640, 1280, 1920]
+IMAGE_FORMATS = [('AVIF', 'image/avif', '.avif', {'quality': 50}), ('WEBP', 'image/webp', '.webp', {'quality': 80, 'method': 6})]
+
+# Relative urls in the CSS, like url('../fonts/Montserrat-Bold.ttf')
+CSS_URL_PATTERN = re.compile(r'''url\((['"]?)\.\./([^'")]+)\1\)''')
+
+# Name a file after the first characters of the SHA-256 of its content
+def hashed_name(path: str, content: bytes) -> str:
+    stem, extension = os.path.splitext(path)
+    return f'{DIST_DIR}/{stem}.{hashlib.sha256(content).hexdigest()[:10]}{extension}'
+
+def write_file(path: str, content: bytes):
+    full_path = os.path.join(STATIC_ROOT, path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as f:
+        f.write(content)
+
+# Write gzip and, when the brotli package is installed, brotli copies next to a file. Copies that aren't smaller are skipped.
+def write_compressed(path: str, content: bytes, brotli) -> list:
+    compressed = [('gzip', '.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+    if brotli:
+        compressed.insert(0, ('br', '.br', brotli.compress(content, quality=11)))
+
+    encodings = []
+    for encoding, suffix, data in compressed:
+        if len(data) < len(content):
+            write_file(path + suffix, data)
+            encodings.append(encoding)
+
+    return encodings
+
+# Point relative urls in the CSS at the hashed copies, the CSS is hashed after so its name changes with them
+def rewrite_css(content: bytes, files: dict) -> bytes:
+    def replace(match):
+        quote, path = match.groups()
+        hashed = files.get(path)
+        return f'url({quote}../{hashed[len(DIST_DIR) + 1:]}{quote})' if hashed else match.group(0)
+
+    return CSS_URL_PATTERN.sub(replace, content.decode('utf-8')).encode('utf-8')
+
+# Resize a background to each width it's wider than, plus its own width when that's under the widest one
+def build_image_variants(path: str, formats: list) -> dict:
+    from PIL import Image
+
+    variants = {}
+    with Image.open(os.path.join(STATIC_ROOT, path)) as image:
+        image = image.convert('RGB')
+        widths = sorted({width for width in BACKGROUND_WIDTHS if width < image.width} | {min(image.width, BACKGROUND_WIDTHS[-1])})
+        stem = os.path.splitext(path)[0]
+
+        for width in widths:
+            height = round(image.height * width / image.width)
+            resized = image.resize((width, height), Image.LANCZOS) if width != image.width else image
+
+            for image_format, mimetype, extension, options in formats:
+                output = BytesIO()
+                resized.save(output, image_format, **options)
+                content = output.getvalue()
+
+                variant_path = hashed_name(f'{stem}-{width}{extension}', content)
+                write_file(variant_path, content)
+                variants.setdefault(mimetype, []).append([width, variant_path])
+
+    return variants
+
+# Image formats this Pillow build can write, AVIF needs Pillow 11.2 or a build with libavif
+def get_image_formats() -> list:
+    from PIL import features
+
+    formats = []
+    for image_format, mimetype, extension, options in IMAGE_FORMATS:
+        if features.check(image_format.lower()):
+            formats.append((image_format, mimetype, extension, options))
+        else:
+            print(f'Skipping {image_format}, not supported by this Pillow build.')
+
+    return formats
+
+# Name every static file after its content, returning {path: hashed path} and {hashed path: content}
+def hash_files() -> tuple:
+    files = {}
+    contents = {}
+    for folder in HASHED_DIRS:
+        for name in sorted(os.listdir(os.path.join(STATIC_ROOT, folder))):
+            path = f'{folder}/{name}'
+            if BACKGROUND_PATTERN.search(path):
+                continue
+
+            with open(os.path.join(STATIC_ROOT, path), 'rb') as f:
+                content = f.read()
+
+            if path.endswith('.css'):
+                content = rewrite_css(content, files)
+
+            files[path] = hashed_name(path, content)
+            contents[files[path]] = content
+
+    return files, contents
+
+# The build output is committed, so compare the committed manifest to the static files to catch a missed rebuild
+def check_manifest(files: dict) -> int:
+    try:
+        with open(MANIFEST_PATH, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f'Error loading {MANIFEST_PATH}: {e}')
+        return 1
+
+    built = manifest.get('files', {})
+    stale = sorted(path for path in files.keys() | built.keys() if files.get(path) != built.get(path))
+    missing = sorted(path for path in built.values() if not os.path.exists(os.path.join(STATIC_ROOT, path)))
+
+    for path in stale:
+        print(f'Out of date: {path}')
+    for path in missing:
+        print(f'Missing: {path}')
+
+    if stale or missing:
+        print('Run scripts/build_assets.py and commit the output.')
+        return 1
+
+    print('Built assets are up to date.')
+    return 0
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description='Build content hashed, precompressed and resized static assets into static/dist.')
+    parser.add_argument('--no-images', action='store_true', help='Skip resizing the background images')
+    parser.add_argument('--check', action='store_true', help='Check the committed build matches the static files, without building')
+    args = parser.parse_args()
+
+    files, contents = hash_files()
+    if args.check:
+        return check_manifest(files)
+
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+        print('Skipping brotli, install the brotli package to build .br files.')
+
+    # Start from an empty folder so old hashed files don't pile up
+    shutil.rmtree(os.path.join(STATIC_ROOT, DIST_DIR), ignore_errors=True)
+
+    encodings = {}
+    for path, content in contents.items():
+        write_file(path, content)
+
+        if path.endswith(COMPRESSED_EXTENSIONS):
+            encodings[path] = write_compressed(path, content, brotli)
+
+    images = {}
+    if not args.no_images:
+        formats = get_image_formats()
+        for name in sorted(os.listdir(os.path.join(STATIC_ROOT, 'images'))):
+            path = f'images/{name}'
+            if BACKGROUND_PATTERN.search(path) and formats:
+                images[path] = build_image_variants(path, formats)
+
+    manifest = {'files': files, 'encodings': encodings, 'images': images}
+    with open(MANIFEST_PATH, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+    variant_count = sum(len(variants) for image in images.values() for variants in image.values())
+    total = sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(os.path.join(STATIC_ROOT, DIST_DIR)) for name in names)
+    print(f'Built {len(files)} files and {variant_count} image variants ({total / 1024:.0f} KB) in static/{DIST_DIR}, manifest in {os.path.relpath(MANIFEST_PATH, APP_ROOT)}.')
+
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
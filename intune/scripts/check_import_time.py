@@ -0,0 +1,84 @@
+import os
+import sys
+import argparse
+import subprocess
+
+# Directory containing app.py, imports are measured from here just like the serverless entry point
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Cold start budget for importing the app, and modules that should only load when a route needs them
+IMPORT_TIME_BUDGET_MS = float(os.environ.get('IMPORT_TIME_BUDGET_MS', 300))
+LAZY_MODULES = ['pandas', 'PIL', 'requests']
+
+# Import a module in a fresh interpreter and parse the output of python -X importtime
+def measure_import(module: str) -> list[tuple[str, int, int]]:
+
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=APP_ROOT,
+        capture_output=True,
+        text=True
+    )
+
+    if result.returncode != 0:
+        print(result.stderr)
+        raise Exception(f'Failed to import {module}.')
+
+    # Each line looks like "import time:   self [us] | cumulative | imported package"
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue
+
+        timings.append((name.rstrip(), int(self_us), int(cumulative_us)))
+
+    return timings
+
+def main() -> int:
+
+    parser = argparse.ArgumentParser(description='Check the cold start import time of the app against a budget.')
+    parser.add_argument('--module', default='app', help='Module to import (default: app)')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_TIME_BUDGET_MS, help='Max allowed import time in milliseconds')
+    parser.add_argument('--runs', type=int, default=3, help='Number of fresh imports, the fastest one is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest modules to list')
+    args = parser.parse_args()
+
+    # Take the fastest run to reduce noise from the machine
+    best_ms, best_timings = None, None
+    for _ in range(args.runs):
+        timings = measure_import(args.module)
+        total_ms = next(cumulative for name, _, cumulative in timings if name.strip() == args.module) / 1000
+
+        if best_ms is None or total_ms < best_ms:
+            best_ms, best_timings = total_ms, timings
+
+    print(f'Slowest modules imported by {args.module}:')
+    for name, self_us, _ in sorted(best_timings, key=lambda timing: timing[1], reverse=True)[:args.top]:
+        print(f'  {self_us / 1000:8.1f} ms  {name.strip()}')
+
+    print(f'Import time for {args.module}: {best_ms:.1f} ms (budget {args.budget_ms:.0f} ms)')
+
+    failed = False
+
+    if best_ms > args.budget_ms:
+        print(f'FAIL: import time is over budget by {best_ms - args.budget_ms:.1f} ms.')
+        failed = True
+
+    # Heavy modules should be imported lazily by the routes that use them
+    imported = {name.strip().split('.')[0] for name, _, _ in best_timings}
+    for module in LAZY_MODULES:
+        if module in imported:
+            print(f'FAIL: {module} is imported at startup.')
+            failed = True
+
+    if not failed:
+        print('OK')
+
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
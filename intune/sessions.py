@@ -0,0 +1,179 @@
+import os
+import time
+import cache
+import secrets
+import threading
+from flask.sessions import SessionInterface, SecureCookieSession, SecureCookieSessionInterface
+
+# Session settings, 'cookie' keeps the whole session in a signed cookie, 'memory' and 'sqlite' keep it on the server
+# and only send a session id. Serverless instances don't share memory or /tmp, so server side sessions are opt in.
+SESSION_BACKEND = os.environ.get('SESSION_BACKEND', 'cookie')
+SESSION_TTL = int(os.environ.get('SESSION_TTL', 7 * 24 * 60 * 60))
+SESSION_CACHE_BYTES = int(os.environ.get('SESSION_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Session stored on the server, the cookie only holds its id
+class ServerSession(SecureCookieSession):
+    def __init__(self, initial=None, sid: str = None):
+        super().__init__(initial)
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.old_sid = None
+
+    # Move to a new id, the entry under the old one is deleted when the session is saved
+    def regenerate(self):
+        if self.old_sid is None:
+            self.old_sid = self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.modified = True
+
+# Start a fresh session for a login, so an id planted in the browser beforehand never ends up holding the new tokens.
+# Cookie sessions have no id to plant, clearing them is enough.
+def start_new_session(session):
+    session.clear()
+
+    if isinstance(session, ServerSession):
+        session.regenerate()
+
+# Cookie bytes and load/save time of the session on each request, for comparing backends
+class SessionStats:
+    def __init__(self, backend: str):
+        self.backend = backend
+        self.requests = 0
+        self.cookie_bytes = 0
+        self.max_cookie_bytes = 0
+        self.set_cookie_bytes = 0
+        self.max_set_cookie_bytes = 0
+        self.load_ms = 0
+        self.save_ms = 0
+        self.lock = threading.Lock()
+
+    def record(self, cookie_bytes: int, set_cookie_bytes: int, load_ms: float, save_ms: float):
+        with self.lock:
+            self.requests += 1
+            self.cookie_bytes += cookie_bytes
+            self.max_cookie_bytes = max(self.max_cookie_bytes, cookie_bytes)
+            self.set_cookie_bytes += set_cookie_bytes
+            self.max_set_cookie_bytes = max(self.max_set_cookie_bytes, set_cookie_bytes)
+            self.load_ms += load_ms
+            self.save_ms += save_ms
+
+    def stats(self) -> dict:
+        with self.lock:
+            requests = max(self.requests, 1)
+            return {
+                'backend': self.backend,
+                'requests': self.requests,
+                'avg_cookie_bytes': round(self.cookie_bytes / requests),
+                'max_cookie_bytes': self.max_cookie_bytes,
+                'avg_set_cookie_bytes': round(self.set_cookie_bytes / requests),
+                'max_set_cookie_bytes': self.max_set_cookie_bytes,
+                'avg_load_ms': round(self.load_ms / requests, 3),
+                'avg_save_ms': round(self.save_ms / requests, 3)
+            }
+
+# Times loading and saving the session and records the cookie sizes, also reported per request in Server-Timing
+class MeasuredSessionInterface:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session_stats = SessionStats(self.backend)
+
+    def open_session(self, app, request):
+        start = time.perf_counter()
+        session = super().open_session(app, request)
+
+        if session is not None:
+            session.cookie_bytes = len(request.cookies.get(self.get_cookie_name(app), ''))
+            session.load_ms = (time.perf_counter() - start) * 1000
+
+        return session
+
+    def save_session(self, app, session, response):
+        start = time.perf_counter()
+        super().save_session(app, session, response)
+        save_ms = (time.perf_counter() - start) * 1000
+
+        cookie_name = self.get_cookie_name(app)
+        set_cookie_bytes = sum(len(header) for header in response.headers.getlist('Set-Cookie') if header.startswith(f'{cookie_name}='))
+
+        load_ms = getattr(session, 'load_ms', 0)
+        self.session_stats.record(getattr(session, 'cookie_bytes', 0), set_cookie_bytes, load_ms, save_ms)
+        response.headers.add('Server-Timing', f'session-load;dur={load_ms:.3f}, session-save;dur={save_ms:.3f}')
+
+    def stats(self) -> dict:
+        return self.session_stats.stats()
+
+# Flask's default signed cookie session, measured so it can be compared to the server side one
+class CookieSessionInterface(MeasuredSessionInterface, SecureCookieSessionInterface):
+    backend = 'cookie'
+
+# Session data kept in one of the app caches as compact tagged JSON, expiring SESSION_TTL after the last write
+class CacheSessionInterface(SessionInterface):
+    serializer = SecureCookieSessionInterface.serializer
+
+    def __init__(self, store):
+        self.store = store
+        self.backend = store.backend
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+
+        # Unknown or expired ids get a new session with a new id, so clients can't pick their own
+        if sid:
+            data = self.store.get(sid)
+            if data is not None:
+                return ServerSession(self.serializer.loads(data), sid)
+
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        # A regenerated session's old id must stop working right away
+        if session.old_sid:
+            self.store.delete(session.old_sid)
+            session.old_sid = None
+
+        # Cleared sessions are removed from the store and the cookie deleted
+        if not session:
+            if session.modified:
+                self.store.delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path, secure=secure, samesite=samesite, httponly=httponly)
+            return
+
+        if not self.should_set_cookie(app, session):
+            return
+
+        if session.modified:
+            self.store.set(session.sid, self.serializer.dumps(dict(session)))
+
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=httponly,
+            domain=domain,
+            path=path,
+            secure=secure,
+            samesite=samesite
+        )
+
+# Server side session, measured like the cookie one
+class ServerSessionInterface(MeasuredSessionInterface, CacheSessionInterface):
+    pass
+
+# Create the session interface for the configured backend
+def create_session_interface(backend: str = None) -> SessionInterface:
+    backend = backend or SESSION_BACKEND
+
+    if backend == 'cookie':
+        return CookieSessionInterface()
+
+    store = cache.create_cache('sessions', SESSION_TTL, SESSION_CACHE_BYTES, backend)
+    return ServerSessionInterface(store)
@@ -1,7 +1,12 @@
 import os
+import time
 import base64
-import requests
-import pandas as pd
+import cache
+import random
+import hashlib
+import threading
+import ratelimit
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlencode
 from http.server import HTTPServer, BaseHTTPRequestHandler
 
@@ -15,6 +20,82 @@ BASE_URL = os.environ.get('BASE_URL')
 REDIRECT_URI = f'{BASE_URL}/callback'
 PORT = int(os.environ.get('PORT', 5000))
 
+# Spotify hosts used by the app
+API_URL = 'https://api.spotify.com'
+ACCOUNTS_URL = 'https://accounts.spotify.com'
+IMAGES_URL = 'https://i.scdn.co'
+
+# HTTP client settings (timeouts in seconds, pool sizes are max kept-alive connections per host)
+CONNECT_TIMEOUT = float(os.environ.get('SPOTIFY_CONNECT_TIMEOUT', 3.05))
+READ_TIMEOUT = float(os.environ.get('SPOTIFY_READ_TIMEOUT', 10))
+POOL_SIZES = {
+    API_URL: int(os.environ.get('SPOTIFY_API_POOL_SIZE', 20)),
+    ACCOUNTS_URL: int(os.environ.get('SPOTIFY_ACCOUNTS_POOL_SIZE', 5)),
+    IMAGES_URL: int(os.environ.get('SPOTIFY_IMAGES_POOL_SIZE', 10))
+}
+
+# Retries for rate limited (429) and failing (5xx) responses, waits are in seconds
+MAX_RETRIES = int(os.environ.get('SPOTIFY_MAX_RETRIES', 3))
+RETRY_BACKOFF = float(os.environ.get('SPOTIFY_RETRY_BACKOFF', 0.5))
+MAX_RETRY_AFTER = float(os.environ.get('SPOTIFY_MAX_RETRY_AFTER', 10))
+RATE_LIMIT_MAX_WAIT = float(os.environ.get('SPOTIFY_RATE_LIMIT_MAX_WAIT', 5))
+
+# Most time one call spends on its attempts and waits, kept under the worker and function timeouts so the user gets the
+# rate limit page instead of a killed request
+REQUEST_BUDGET = float(os.environ.get('SPOTIFY_REQUEST_BUDGET', 10))
+
+# Access tokens are refreshed this many seconds before they expire, and reused by requests still holding the old token
+TOKEN_REFRESH_MARGIN = int(os.environ.get('SPOTIFY_TOKEN_REFRESH_MARGIN', 60))
+REFRESHED_TOKEN_TTL = int(os.environ.get('SPOTIFY_REFRESHED_TOKEN_TTL', 5 * 60))
+DEFAULT_EXPIRES_IN = 3600
+
+# Max number of Spotify requests made in parallel by a single process
+FETCH_WORKERS = int(os.environ.get('SPOTIFY_FETCH_WORKERS', 8))
+
+# Time ranges loaded in the background after login, and how many are loaded at once. Warm-up is off by default with
+# the in-process memory cache, since a serverless instance is frozen once the response is sent and the next request
+# may land on another instance, so the calls would be spent for nothing.
+TIME_RANGES = ['short_term', 'medium_term', 'long_term']
+WARMUP_WORKERS = int(os.environ.get('SPOTIFY_WARMUP_WORKERS', 2))
+WARMUP_ENABLED = os.environ.get('SPOTIFY_WARMUP', '1' if cache.CACHE_BACKEND == 'sqlite' else '0') == '1'
+
+# Top items are cached per user and time range as full pages, smaller limits are sliced from them.
+# Spotify returns at most 50 items per page, larger limits fetch up to SPOTIFY_MAX_TOP_PAGES pages concurrently.
+TOP_ITEMS_PAGE_SIZE = 50
+MAX_TOP_PAGES = int(os.environ.get('SPOTIFY_MAX_TOP_PAGES', 4))
+MAX_TOP_ITEMS = TOP_ITEMS_PAGE_SIZE * MAX_TOP_PAGES
+TOP_ITEMS_CACHE_TTL = int(os.environ.get('TOP_ITEMS_CACHE_TTL', 3 * 60 * 60))
+TOP_ITEMS_CACHE_BYTES = int(os.environ.get('TOP_ITEMS_CACHE_BYTES', 32 * 1024 * 1024))
+
+top_items_cache = cache.create_cache('top_items', TOP_ITEMS_CACHE_TTL, TOP_ITEMS_CACHE_BYTES)
+
+# Catalog search results don't depend on the user, so one cache is shared by everyone
+SEARCH_CACHE_TTL = int(os.environ.get('SEARCH_CACHE_TTL', 10 * 60))
+SEARCH_CACHE_BYTES = int(os.environ.get('SEARCH_CACHE_BYTES', 16 * 1024 * 1024))
+
+search_cache = cache.create_cache('search', SEARCH_CACHE_TTL, SEARCH_CACHE_BYTES)
+
+# Concurrent identical GET requests wait on one upstream call and share its result
+spotify_flights = cache.create_single_flight('spotify')
+
+# Artist genres rarely change, so they're kept for a long time and shared by everyone. Spotify returns up to 50
+# artists per request.
+ARTIST_BATCH_SIZE = 50
+ARTIST_CACHE_TTL = int(os.environ.get('ARTIST_CACHE_TTL', 7 * 24 * 60 * 60))
+ARTIST_CACHE_BYTES = int(os.environ.get('ARTIST_CACHE_BYTES', 16 * 1024 * 1024))
+
+artist_cache = cache.create_cache('artists', ARTIST_CACHE_TTL, ARTIST_CACHE_BYTES)
+
+# Spotify accepts at most 100 tracks per add request. Created playlists are remembered by idempotency key so a
+# double submitted request returns the first playlist instead of creating another one.
+PLAYLIST_CHUNK_SIZE = 100
+PLAYLIST_CACHE_TTL = int(os.environ.get('PLAYLIST_CACHE_TTL', 10 * 60))
+
+playlist_cache = cache.create_cache('playlists', PLAYLIST_CACHE_TTL, 1024 * 1024)
+
+# Tokens from recent refreshes keyed by a hash of the refresh token, so parallel requests from one user refresh once
+refreshed_tokens = cache.create_cache('refreshed_tokens', REFRESHED_TOKEN_TTL, 1024 * 1024)
+
 # Store authorization code and access token
 auth_code = None
 access_token = None
@@ -48,6 +129,173 @@ class CallbackHandler(BaseHTTPRequestHandler):
             self.send_response(404)
             self.end_headers()
 
+# Error response from the Spotify API, keeping the status code so callers can react to it
+class SpotifyError(Exception):
+    def __init__(self, message: str, status_code: int = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    # Rate limits and server errors are expected to go away on their own
+    @property
+    def is_transient(self) -> bool:
+        return self.status_code is not None and (self.status_code == 429 or self.status_code >= 500)
+
+# Spotify kept rejecting requests with 429 after all retries
+class SpotifyRateLimitError(SpotifyError):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message, 429)
+        self.retry_after = retry_after
+
+# Build the error for a failed Spotify response
+def response_error(message: str, response) -> SpotifyError:
+    if response.status_code == 429:
+        return SpotifyRateLimitError(message, get_retry_after(response))
+    return SpotifyError(message, response.status_code)
+
+# Get how long Spotify asked us to wait before retrying, in seconds
+def get_retry_after(response) -> float:
+    try:
+        return max(0, float(response.headers.get('Retry-After', 1)))
+    except ValueError:
+        return 1
+
+# HTTP client that reuses pooled keep-alive connections to each Spotify host
+class SpotifyClient:
+    def __init__(self, timeout: tuple = (CONNECT_TIMEOUT, READ_TIMEOUT), pool_sizes: dict = None):
+
+        # Imported here so routes that never call Spotify don't pay for loading requests at cold start
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.bucket = ratelimit.create_bucket()
+
+        # Mount a dedicated connection pool for each host so they can be sized independently
+        for host, pool_size in (pool_sizes or POOL_SIZES).items():
+            self.session.mount(host, HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+
+    def request(self, method: str, url: str, **kwargs) -> 'requests.Response':
+        kwargs.setdefault('timeout', self.timeout)
+
+        # Only Web API calls count against the app's quota
+        rate_limited = url.startswith(API_URL)
+        deadline = time.monotonic() + REQUEST_BUDGET
+
+        for attempt in range(MAX_RETRIES + 1):
+            # While Spotify has us backed off for longer than we'd wait, fail fast instead of adding to the 429s
+            if rate_limited:
+                try:
+                    self.bucket.acquire(max(0, min(RATE_LIMIT_MAX_WAIT, deadline - time.monotonic())))
+                except ratelimit.BucketPaused as e:
+                    raise SpotifyRateLimitError(f'Spotify API error: 429, backing off for {e.retry_after:.1f} seconds', e.retry_after)
+
+            response = self.session.request(method, url, **kwargs)
+
+            if attempt == MAX_RETRIES:
+                break
+
+            if response.status_code == 429:
+                retry_after = get_retry_after(response)
+
+                # Pause the shared bucket so every other request backs off too
+                if rate_limited:
+                    self.bucket.pause(retry_after)
+
+                # Don't hold the request open for long waits, or past its budget, let the caller report the rate limit instead
+                if retry_after > MAX_RETRY_AFTER or time.monotonic() + retry_after > deadline:
+                    break
+
+                print(f'Rate limited by Spotify, retrying in {retry_after} seconds')
+                time.sleep(retry_after)
+
+            elif response.status_code >= 500 and method == 'GET':
+                # Exponential backoff with full jitter, only for GETs since they're safe to repeat
+                delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+                if time.monotonic() + delay > deadline:
+                    break
+
+                print(f'Spotify returned {response.status_code}, retrying in {delay:.2f} seconds')
+                time.sleep(delay)
+
+            else:
+                break
+
+        return response
+
+    def get(self, url: str, **kwargs) -> 'requests.Response':
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> 'requests.Response':
+        return self.request('POST', url, **kwargs)
+
+client = None
+client_lock = threading.Lock()
+executor = None
+warmup_executor = None
+app_token = None # (access token, expiry time) from the client credentials flow
+app_token_lock = threading.Lock()
+
+# Get the shared Spotify client, creating it on first use
+def get_client() -> SpotifyClient:
+    global client
+
+    if client is None:
+        with client_lock:
+            if client is None:
+                client = SpotifyClient()
+
+    return client
+
+# Get the shared thread pool used for concurrent Spotify requests, creating it on first use
+def get_executor() -> ThreadPoolExecutor:
+    global executor
+
+    if executor is None:
+        with client_lock:
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='spotify')
+
+    return executor
+
+# Get the thread pool used to warm up caches after login, kept apart from the request pool since warm-up tasks
+# wait on requests of their own
+def get_warmup_executor() -> ThreadPoolExecutor:
+    global warmup_executor
+
+    if warmup_executor is None:
+        with client_lock:
+            if warmup_executor is None:
+                warmup_executor = ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix='warmup')
+
+    return warmup_executor
+
+# Start loading a user's top items for every time range into the caches in the background, without waiting on them
+def warm_up(access_token: str, user_id: str) -> list:
+
+    # Cached top items are keyed by user, without an ID there's nothing to warm
+    if not WARMUP_ENABLED or not user_id:
+        return []
+
+    try:
+        return [get_warmup_executor().submit(warm_up_time_range, access_token, user_id, time_range) for time_range in TIME_RANGES]
+    except Exception as e:
+        print(f'Error starting warm-up: {e}')
+        return []
+
+# Cache the top items of one time range and the genres of their track artists, as the dashboard would
+def warm_up_time_range(access_token: str, user_id: str, time_range: str):
+    try:
+        artists_data, tracks_data = get_cached_top_items(access_token, user_id, time_range, TOP_ITEMS_PAGE_SIZE)
+
+        artists, _ = parse_artists_data(artists_data)
+        tracks, _ = parse_tracks_data(tracks_data)
+
+        cache_artist_genres(artists)
+        get_artist_genres(access_token, [artist_id for track in tracks for artist_id in track.artist_ids])
+    except Exception as e:
+        print(f'Error warming up {time_range} top items: {e}')
+
 # Create HTTP server to handle callback using local server
 def start_server():
 
@@ -60,7 +308,7 @@ def start_server():
 
 # Create authorization code to exchange for Spotify access token
 def get_authorization_url():
-    auth_url = 'https://accounts.spotify.com/authorize'
+    auth_url = f'{ACCOUNTS_URL}/authorize'
     auth_params = {
         'client_id': CLIENT_ID,
         'response_type': 'code',
@@ -73,7 +321,7 @@ def get_authorization_url():
 # Exchange authorization code for API access token
 def get_access_token(auth_code: str):
     
-    token_url = 'https://accounts.spotify.com/api/token'
+    token_url = f'{ACCOUNTS_URL}/api/token'
     
     # Encode client ID and client secret
     auth_header = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
@@ -89,21 +337,22 @@ def get_access_token(auth_code: str):
         'redirect_uri': REDIRECT_URI
     }
     
-    response = requests.post(token_url, headers=headers, data=payload)
+    response = get_client().post(token_url, headers=headers, data=payload)
     
     if response.status_code == 200:
         token_info = response.json()
-        # Return both access token and refresh token
-        return token_info['access_token'], token_info['refresh_token']
+        # Return access token, refresh token and how many seconds until the access token expires
+        return token_info['access_token'], token_info['refresh_token'], token_info.get('expires_in', DEFAULT_EXPIRES_IN)
     else:
         print(f'Error getting token: {response.status_code}')
         print(response.text)
-        raise Exception('Failed to get access token.')
+        raise response_error('Failed to get access token.', response)
 
-# Refresh an expired access token using refresh token
-def refresh_access_token(refresh_token: str):
+# Refresh an expired access token using refresh token, returning the new access token, seconds until it expires,
+# and the refresh token to use next time (Spotify may rotate it)
+def refresh_access_token(refresh_token: str) -> tuple[str, int, str]:
     
-    token_url = 'https://accounts.spotify.com/api/token'
+    token_url = f'{ACCOUNTS_URL}/api/token'
     
     # Encode client ID and client secret
     auth_header = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
@@ -118,27 +367,135 @@ def refresh_access_token(refresh_token: str):
         'refresh_token': refresh_token
     }
     
-    response = requests.post(token_url, headers=headers, data=payload)
+    response = get_client().post(token_url, headers=headers, data=payload)
     
     if response.status_code == 200:
         token_info = response.json()
-        return token_info['access_token']
+        return token_info['access_token'], token_info.get('expires_in', DEFAULT_EXPIRES_IN), token_info.get('refresh_token', refresh_token)
     else:
         print(f'Error refreshing token: {response.status_code}')
         print(response.text)
-        raise Exception('Failed to refresh access token.')
+        raise response_error('Failed to refresh access token.', response)
+
+# Get a fresh access token for a user, making at most one refresh call at a time per refresh token.
+# Returns the access token, its expiry time and the refresh token to store. A token recently refreshed by another
+# request is reused, unless it's the stale token that Spotify just rejected.
+def refresh_user_token(refresh_token: str, stale_token: str = None) -> tuple[str, float, str]:
+
+    key = hashlib.sha256(refresh_token.encode()).hexdigest()
+
+    refreshed = refreshed_tokens.get(key)
+    if refreshed and refreshed[0] != stale_token and refreshed[1] - TOKEN_REFRESH_MARGIN > time.time():
+        return refreshed
+
+    return spotify_flights.do(('refresh', key), fetch_user_token, refresh_token, key)
 
-# Get the current Spotify user's profile information
+# Refresh a user's access token and remember the result for requests still carrying the old token
+def fetch_user_token(refresh_token: str, key: str) -> tuple[str, float, str]:
+
+    access_token, expires_in, new_refresh_token = refresh_access_token(refresh_token)
+    refreshed = (access_token, time.time() + expires_in, new_refresh_token)
+    refreshed_tokens.set(key, refreshed)
+
+    return refreshed
+
+# Get an app access token using the client credentials flow, for catalog requests that don't need a user
+def get_app_access_token(refresh=False) -> str:
+    global app_token
+
+    if not CLIENT_ID or not CLIENT_SECRET:
+        return None
+
+    # Only one thread requests a new token, the others wait and reuse it
+    with app_token_lock:
+        if refresh or app_token is None or app_token[1] - 60 <= time.time():
+
+            token_url = f'{ACCOUNTS_URL}/api/token'
+
+            # Encode client ID and client secret
+            auth_header = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
+
+            headers = {
+                'Authorization': f'Basic {auth_header}',
+                'Content-Type': 'application/x-www-form-urlencoded'
+            }
+
+            payload = {
+                'grant_type': 'client_credentials'
+            }
+
+            response = get_client().post(token_url, headers=headers, data=payload)
+
+            if response.status_code != 200:
+                print(f'Error getting app token: {response.status_code}')
+                app_token = None
+                return None
+
+            token_info = response.json()
+            app_token = (token_info['access_token'], time.time() + token_info.get('expires_in', 3600))
+
+        return app_token[0]
+
+# Normalize whitespace in a search query, so equivalent searches are sent and cached the same way
+def normalize_query(query: str) -> str:
+    return ' '.join(query.split())
+
+# Get the shared search cache key for a query, searches are case insensitive
+def get_search_key(query: str, search_type: str, limit: int) -> tuple:
+    return (normalize_query(query).casefold(), search_type, limit)
+
+# Search the Spotify catalog, results are shared between all users through the search cache
+def search_catalog(access_token: str, query: str, search_type: str, limit=10) -> list:
+
+    key = get_search_key(query, search_type, limit)
+    items = search_cache.get(key)
+
+    if items is None:
+        items = spotify_flights.do(('search',) + key, fetch_search_items, access_token, query, search_type, limit)
+
+    return items
+
+# Request search results from Spotify and store them in the search cache
+def fetch_search_items(access_token: str, query: str, search_type: str, limit=10) -> list:
+
+    search_url = f'{API_URL}/v1/search'
+    headers = { 'Authorization': f'Bearer {access_token}' }
+
+    params = {
+        'q': normalize_query(query),
+        'type': search_type,
+        'limit': limit
+    }
+
+    response = get_client().get(search_url, headers=headers, params=params)
+
+    if response.status_code != 200:
+        print(f'Spotify search failed: {response.status_code}, {response.text}')
+        raise response_error(f'Spotify API error: {response.status_code}', response)
+
+    search_data = response.json()
+
+    # Extract relevant data based on search type
+    items = search_data.get(f'{search_type}s', {}).get('items', [])
+    search_cache.set(get_search_key(query, search_type, limit), items)
+
+    return items
+
+# Get the current Spotify user's profile information, sharing the request with identical concurrent calls
 def get_user_profile(access_token: str) -> dict:
+    return spotify_flights.do(('profile', access_token), fetch_user_profile, access_token)
 
-    user_url = 'https://api.spotify.com/v1/me'
+# Request the current user's profile from Spotify
+def fetch_user_profile(access_token: str) -> dict:
+
+    user_url = f'{API_URL}/v1/me'
     headers = { 'Authorization': f'Bearer {access_token}' }
 
-    user_response = requests.get(user_url, headers=headers)
+    user_response = get_client().get(user_url, headers=headers)
 
     if user_response.status_code != 200:
         print(f'Error getting user profile: {user_response.status_code}, {user_response.text}')
-        raise Exception('Failed to get user profile.')
+        raise response_error('Failed to get user profile.', user_response)
     
     user_data = user_response.json()
 
@@ -152,38 +509,219 @@ def get_user_profile(access_token: str) -> dict:
 
     return profile_info
 
-# Get top artists and tracks for the given time range (simplified for limits ≤ 50)
-def get_top_items(access_token: str, time_range: str, limit=10) -> tuple[dict, dict]:
+# Get the genres of each artist, from the artist cache where possible and in batches of 50 for the rest
+def get_artist_genres(access_token: str, artist_ids: list) -> dict[str, list]:
+
+    genres = {}
+    missing_ids = []
+
+    for artist_id in dict.fromkeys(artist_ids):
+        artist_genres = artist_cache.get(artist_id)
+        if artist_genres is None:
+            missing_ids.append(artist_id)
+        else:
+            genres[artist_id] = artist_genres
+
+    batches = [missing_ids[i:i + ARTIST_BATCH_SIZE] for i in range(0, len(missing_ids), ARTIST_BATCH_SIZE)]
+    futures = [get_executor().submit(get_artists_batch, access_token, batch) for batch in batches]
+
+    for future in futures:
+        genres.update(future.result())
 
-    artists_url = f'https://api.spotify.com/v1/me/top/artists?time_range={time_range}&limit={limit}&offset=0'
-    tracks_url = f'https://api.spotify.com/v1/me/top/tracks?time_range={time_range}&limit={limit}&offset=0'
+    return genres
 
+# Remember the genres of artists that were already fetched, such as the user's top artists
+def cache_artist_genres(artists: list):
+    for artist in artists:
+        if not artist.is_placeholder:
+            artist_cache.set(artist.id, artist.genres)
+
+# Get the genres of up to 50 artists, sharing the request with identical concurrent calls
+def get_artists_batch(access_token: str, artist_ids: list) -> dict[str, list]:
+    return spotify_flights.do(('artists', tuple(artist_ids)), fetch_artists_batch, access_token, artist_ids)
+
+# Request up to 50 artists from Spotify in one call and store their genres in the artist cache
+def fetch_artists_batch(access_token: str, artist_ids: list) -> dict[str, list]:
+
+    url = f'{API_URL}/v1/artists'
     headers = { 'Authorization': f'Bearer {access_token}' }
-    
-    # Get artists
-    artists_response = requests.get(artists_url, headers=headers)
-    
-    if artists_response.status_code == 200:
-        artists_data = artists_response.json()
-    else:
-        print(f'Error getting artists: {artists_response.status_code}')
-        raise Exception('Failed to get your top artists data.')
-    
-    # Get tracks
-    tracks_response = requests.get(tracks_url, headers=headers)
-    
-    if tracks_response.status_code == 200:
-        tracks_data = tracks_response.json()
-    else:
-        print(f'Error getting tracks: {tracks_response.status_code}')
-        raise Exception('Failed to get your top tracks data.')
-    
+
+    response = get_client().get(url, headers=headers, params={'ids': ','.join(artist_ids)})
+
+    if response.status_code != 200:
+        print(f'Error getting artists: {response.status_code}')
+        raise response_error('Failed to get artist details.', response)
+
+    genres = {}
+    for artist in response.json().get('artists', []):
+        # Unknown IDs come back as null
+        if artist:
+            genres[artist['id']] = artist.get('genres', [])
+            artist_cache.set(artist['id'], genres[artist['id']])
+
+    return genres
+
+# Get top artists and tracks for the given time range, limits over 50 are fetched as several pages
+def get_top_items(access_token: str, time_range: str, limit=10, concurrent=True) -> tuple[dict, dict]:
+
+    page_sizes = get_page_sizes(limit)
+
+    if not concurrent:
+        artists_data = merge_pages(get_top_page(access_token, 'artists', time_range, page_limit, offset) for offset, page_limit in page_sizes)
+        tracks_data = merge_pages(get_top_page(access_token, 'tracks', time_range, page_limit, offset) for offset, page_limit in page_sizes)
+        return artists_data, tracks_data
+
+    # Start every page request together, then collect artists first so a failure raises the same error as before
+    artists_futures = [get_executor().submit(get_top_page, access_token, 'artists', time_range, page_limit, offset) for offset, page_limit in page_sizes]
+    tracks_futures = [get_executor().submit(get_top_page, access_token, 'tracks', time_range, page_limit, offset) for offset, page_limit in page_sizes]
+
+    try:
+        artists_data = merge_pages(future.result() for future in artists_futures)
+        tracks_data = merge_pages(future.result() for future in tracks_futures)
+    finally:
+        # Pages past the end of the user's items, or after a failure, aren't needed
+        for future in artists_futures + tracks_futures:
+            future.cancel()
+
     return artists_data, tracks_data
 
-# Parse artist json data into DataFrame and total artist count
-def parse_artists_data(artists_data: dict) -> tuple[pd.DataFrame, int]:
+# Split a limit into (offset, limit) pages of at most 50 items, capped at SPOTIFY_MAX_TOP_PAGES pages
+def get_page_sizes(limit: int) -> list[tuple[int, int]]:
+    limit = min(limit, MAX_TOP_ITEMS)
+    return [(offset, min(TOP_ITEMS_PAGE_SIZE, limit - offset)) for offset in range(0, limit, TOP_ITEMS_PAGE_SIZE)]
+
+# Merge pages of top items into one page as they arrive in order, dropping market lists from each page right away
+# so only the trimmed items are kept. Stops at the first short page since there's nothing after it.
+def merge_pages(pages) -> dict:
+
+    items = []
+    total = 0
+
+    for page in pages:
+        page_items = compact_page(page)['items']
+        items.extend(page_items)
+        total = page.get('total', total)
+
+        if len(page_items) < page.get('limit', TOP_ITEMS_PAGE_SIZE):
+            break
+
+    return {'items': items, 'total': total}
+
+# Get top artists and tracks from the per-user cache, fetching full pages on a miss or when more items are needed
+def get_cached_top_items(access_token: str, user_id: str, time_range: str, limit=10, refresh=False) -> tuple[dict, dict]:
+
+    limit = min(limit, MAX_TOP_ITEMS)
+
+    # Without a user ID there's no safe cache key, so go straight to Spotify
+    if not user_id:
+        return get_top_items(access_token, time_range, limit)
+
+    key = (user_id, time_range)
+    cached_items = None if refresh else top_items_cache.get(key)
+
+    # Fetch whole pages so nearby limits are served from the same entry
+    if cached_items is None or not has_items(cached_items, limit):
+        depth = -(-limit // TOP_ITEMS_PAGE_SIZE) * TOP_ITEMS_PAGE_SIZE
+        cached_items = spotify_flights.do(('top_items',) + key + (depth,), fetch_cached_top_items, access_token, user_id, time_range, depth)
+
+    artists_data, tracks_data = cached_items
+    return slice_page(artists_data, limit), slice_page(tracks_data, limit)
+
+# Check if cached top items hold at least limit artists and tracks, or everything the user has
+def has_items(cached_items: tuple[dict, dict], limit: int) -> bool:
+    return all(len(data['items']) >= min(limit, data.get('total', 0)) for data in cached_items)
+
+# Fetch full pages of top artists and tracks and store them in the per-user cache
+def fetch_cached_top_items(access_token: str, user_id: str, time_range: str, depth=TOP_ITEMS_PAGE_SIZE) -> tuple[dict, dict]:
+
+    cached_items = get_top_items(access_token, time_range, depth)
+    top_items_cache.set((user_id, time_range), cached_items)
 
-    final_artists = pd.DataFrame(columns=['id', 'name', 'genres', 'popularity', 'followers', 'link', 'image'])
+    return cached_items
+
+# Drop market lists from a page of items, they're by far the largest fields and are never used
+def compact_page(data: dict) -> dict:
+    items = []
+    for item in data.get('items', []):
+        item = {key: value for key, value in item.items() if key != 'available_markets'}
+        if isinstance(item.get('album'), dict):
+            item['album'] = {key: value for key, value in item['album'].items() if key != 'available_markets'}
+        items.append(item)
+
+    return {**data, 'items': items}
+
+# Get a copy of a page containing only the first limit items
+def slice_page(data: dict, limit: int) -> dict:
+    return {**data, 'items': data.get('items', [])[:limit]}
+
+# Get a single page of the user's top artists or tracks, sharing the request with identical concurrent calls
+def get_top_page(access_token: str, item_type: str, time_range: str, limit=10, offset=0) -> dict:
+    key = ('top_page', access_token, item_type, time_range, limit, offset)
+    return spotify_flights.do(key, fetch_top_page, access_token, item_type, time_range, limit, offset)
+
+# Request a single page of the user's top artists or tracks from Spotify
+def fetch_top_page(access_token: str, item_type: str, time_range: str, limit=10, offset=0) -> dict:
+
+    url = f'{API_URL}/v1/me/top/{item_type}?time_range={time_range}&limit={limit}&offset={offset}'
+    headers = { 'Authorization': f'Bearer {access_token}' }
+
+    response = get_client().get(url, headers=headers)
+
+    if response.status_code == 200:
+        return response.json()
+    else:
+        print(f'Error getting {item_type}: {response.status_code}')
+        raise response_error(f'Failed to get your top {item_type} data.', response)
+
+# Compact record of a single top artist
+class Artist:
+    __slots__ = ('id', 'name', 'genres', 'popularity', 'followers', 'link', 'image')
+
+    def __init__(self, id: str, name: str, genres: list, popularity: int, followers: str, link: str, image: str = None):
+        self.id = id
+        self.name = name
+        self.genres = genres
+        self.popularity = popularity
+        self.followers = followers
+        self.link = link
+        self.image = image
+
+    # Create an empty artist used to fill unused grid slots
+    @classmethod
+    def placeholder(cls, index: int) -> 'Artist':
+        return cls(f'placeholder-artist-{index}', 'No Data Available', [], 0, 0, '#', None)
+
+    @property
+    def is_placeholder(self) -> bool:
+        return str(self.id).startswith('placeholder')
+
+# Compact record of a single top track
+class Track:
+    __slots__ = ('id', 'name', 'artists', 'release_date', 'popularity', 'link', 'image', 'artist_ids')
+
+    def __init__(self, id: str, name: str, artists: list, release_date: str, popularity: int, link: str, image: str = None, artist_ids: list = None):
+        self.id = id
+        self.name = name
+        self.artists = artists
+        self.release_date = release_date
+        self.popularity = popularity
+        self.link = link
+        self.image = image
+        self.artist_ids = artist_ids or []
+
+    # Create an empty track used to fill unused grid slots
+    @classmethod
+    def placeholder(cls, index: int) -> 'Track':
+        return cls(f'placeholder-track-{index}', 'No Data Available', [''], '', 0, '#', None)
+
+    @property
+    def is_placeholder(self) -> bool:
+        return str(self.id).startswith('placeholder')
+
+# Parse artist json data into a list of artists and total artist count
+def parse_artists_data(artists_data: dict) -> tuple[list[Artist], int]:
+
+    final_artists = []
 
     try:
         # Handle case where there are no items
@@ -202,8 +740,7 @@ def parse_artists_data(artists_data: dict) -> tuple[pd.DataFrame, int]:
             # Format followers for readability
             formatted_followers = f'{followers:,}'
 
-            row = [id, name, genres, popularity, formatted_followers, link, image]
-            final_artists.loc[len(final_artists)] = row
+            final_artists.append(Artist(id, name, genres, popularity, formatted_followers, link, image))
 
         total_artists = f'{artists_data.get("total", 0):,}'
     except Exception as e:
@@ -212,10 +749,10 @@ def parse_artists_data(artists_data: dict) -> tuple[pd.DataFrame, int]:
 
     return final_artists, total_artists
 
-# Parse track json data into DataFrame and total track count
-def parse_tracks_data(tracks_data: dict) -> tuple[pd.DataFrame, int]:
+# Parse track json data into a list of tracks and total track count
+def parse_tracks_data(tracks_data: dict) -> tuple[list[Track], int]:
 
-    final_tracks = pd.DataFrame(columns=['id', 'name', 'artists', 'release_date', 'popularity', 'link', 'image'])
+    final_tracks = []
 
     try:
         # Handle case where there are no items
@@ -227,8 +764,11 @@ def parse_tracks_data(tracks_data: dict) -> tuple[pd.DataFrame, int]:
             name = item['name']
             
             artists = []
+            artist_ids = []
             for artist in item['artists']:
                 artists.append(artist['name'])
+                if artist.get('id'):
+                    artist_ids.append(artist['id'])
 
             release_date = str(item['album']['release_date'])
             popularity = item['popularity']
@@ -238,8 +778,7 @@ def parse_tracks_data(tracks_data: dict) -> tuple[pd.DataFrame, int]:
             # Handle different release date formats
             formatted_release_date = format_release_date(release_date)
 
-            row = [id, name, artists, formatted_release_date, popularity, link, image]
-            final_tracks.loc[len(final_tracks)] = row
+            final_tracks.append(Track(id, name, artists, formatted_release_date, popularity, link, image, artist_ids))
 
         total_tracks = f'{tracks_data.get("total", 0):,}'
     except Exception as e:
@@ -272,42 +811,40 @@ def format_release_date(release_date: str) -> str:
         # If any conversion fails, return the original date
         return release_date
 
-# Create a new Spotify playlist with custom name and current displayed tracks
-def create_playlist(access_token: str, playlist_name: str, tracks_list: list) -> dict:
+# Create a playlist once per idempotency key, repeated or concurrent requests with the same key get the same playlist
+def create_playlist_once(idempotency_key: str, access_token: str, user_id: str, playlist_name: str, tracks_list: list) -> dict:
 
-    # Get the user's profile ID
-    user_url = 'https://api.spotify.com/v1/me'
-    headers = { 'Authorization': f'Bearer {access_token}' }
+    # Keys are scoped to the resolved user, so sessions without a stored profile can't share a key space and reuse
+    # each other's playlists
+    if not user_id:
+        user_id = get_user_profile(access_token)['user_id']
 
-    user_response = requests.get(user_url, headers=headers)
+    key = (user_id, idempotency_key)
 
-    if user_response.status_code != 200:
-        print(f'Error getting user profile: {user_response.status_code}, {user_response.text}')
-        raise Exception('Failed to get user profile.')
-    
-    user_data = user_response.json()
-    user_id = user_data['id']
+    playlist_info = playlist_cache.get(key)
+    if playlist_info is not None:
+        return playlist_info
 
-    # Create a new playlist from top items
-    playlist_url = f'https://api.spotify.com/v1/users/{user_id}/playlists'
-    playlist_data = {
-        'name': playlist_name,
-        'description': 'Created using the InTune app.',
-        'public': False # Playlist is private by default
-    }
+    return spotify_flights.do(('playlist',) + key, fetch_created_playlist, key, access_token, user_id, playlist_name, tracks_list)
 
-    playlist_response = requests.post(
-        playlist_url, 
-        headers={**headers, 'Content-Type': 'application/json'}, # Add content type to current header
-        json=playlist_data
-    )
+# Create the playlist unless an earlier request with the same key already finished, and remember the result
+def fetch_created_playlist(key: tuple, access_token: str, user_id: str, playlist_name: str, tracks_list: list) -> dict:
 
-    if playlist_response.status_code != 201:
-        print(f'Error creating playlist: {playlist_response.status_code}, {playlist_response.text}')
-        raise Exception('Failed to create playlist.')
-    
-    playlist_info = playlist_response.json()
-    playlist_id = playlist_info['id']
+    playlist_info = playlist_cache.get(key)
+    if playlist_info is None:
+        playlist_info = create_playlist(access_token, user_id, playlist_name, tracks_list)
+        playlist_cache.set(key, playlist_info)
+
+    return playlist_info
+
+# Create a new Spotify playlist with custom name and current displayed tracks
+def create_playlist(access_token: str, user_id: str, playlist_name: str, tracks_list: list) -> dict:
+
+    headers = { 'Authorization': f'Bearer {access_token}' }
+
+    # The user ID is normally known from login, only older sessions need to look it up
+    if not user_id:
+        user_id = get_user_profile(access_token)['user_id']
 
     # Get track IDs from tracks_list
     track_ids = []
@@ -326,22 +863,30 @@ def create_playlist(access_token: str, playlist_name: str, tracks_list: list) ->
     
     if not track_ids:
         raise Exception('No valid tracks found for playlist creation.')
-    
-    # Add tracks to playlist using post request
-    tracks_url = f'https://api.spotify.com/v1/playlists/{playlist_id}/tracks'
-    track_uris = [f'spotify:track:{track_id}' for track_id in track_ids]
 
-    add_tracks_data = {'uris': track_uris}
+    # Create a new playlist from top items
+    playlist_url = f'{API_URL}/v1/users/{user_id}/playlists'
+    playlist_data = {
+        'name': playlist_name,
+        'description': 'Created using the InTune app.',
+        'public': False # Playlist is private by default
+    }
 
-    add_tracks_response = requests.post(
-        tracks_url, 
-        headers={**headers, 'Content-Type': 'application/json'},
-        json=add_tracks_data
+    playlist_response = get_client().post(
+        playlist_url, 
+        headers={**headers, 'Content-Type': 'application/json'}, # Add content type to current header
+        json=playlist_data
     )
 
-    if add_tracks_response.status_code != 201:
-        print(f'Error adding tracks to playlist: {add_tracks_response.status_code}, {add_tracks_response.text}')
-        raise Exception('Failed to add tracks to playlist.')
+    if playlist_response.status_code != 201:
+        print(f'Error creating playlist: {playlist_response.status_code}, {playlist_response.text}')
+        raise response_error('Failed to create playlist.', playlist_response)
+    
+    playlist_info = playlist_response.json()
+    playlist_id = playlist_info['id']
+
+    track_uris = [f'spotify:track:{track_id}' for track_id in track_ids]
+    add_playlist_tracks(access_token, playlist_id, track_uris)
     
     # Return created playlist details
     return {
@@ -350,3 +895,43 @@ def create_playlist(access_token: str, playlist_name: str, tracks_list: list) ->
         'url': playlist_info['external_urls']['spotify'],
         'tracks_added': len(track_ids)
     }
+
+# Add tracks to a playlist in chunks of 100. Chunks are sent one after another since each one is placed after the
+# previous, and a chunk that fails with a server error is only retried if it didn't make it into the playlist.
+def add_playlist_tracks(access_token: str, playlist_id: str, track_uris: list):
+
+    tracks_url = f'{API_URL}/v1/playlists/{playlist_id}/tracks'
+    headers = { 'Authorization': f'Bearer {access_token}', 'Content-Type': 'application/json' }
+
+    for position in range(0, len(track_uris), PLAYLIST_CHUNK_SIZE):
+        chunk = track_uris[position:position + PLAYLIST_CHUNK_SIZE]
+
+        for attempt in range(MAX_RETRIES + 1):
+            add_tracks_response = get_client().post(tracks_url, headers=headers, json={'uris': chunk, 'position': position})
+
+            if add_tracks_response.status_code in (200, 201):
+                break
+
+            if add_tracks_response.status_code < 500 or attempt == MAX_RETRIES:
+                print(f'Error adding tracks to playlist: {add_tracks_response.status_code}, {add_tracks_response.text}')
+                raise response_error('Failed to add tracks to playlist.', add_tracks_response)
+
+            if get_playlist_length(access_token, playlist_id) >= position + len(chunk):
+                break
+
+            delay = random.uniform(0, RETRY_BACKOFF * 2 ** attempt)
+            print(f'Spotify returned {add_tracks_response.status_code} adding tracks, retrying in {delay:.2f} seconds')
+            time.sleep(delay)
+
+# Get the number of tracks in a playlist, or -1 if it can't be read
+def get_playlist_length(access_token: str, playlist_id: str) -> int:
+
+    playlist_url = f'{API_URL}/v1/playlists/{playlist_id}'
+    headers = { 'Authorization': f'Bearer {access_token}' }
+
+    response = get_client().get(playlist_url, headers=headers, params={'fields': 'tracks.total'})
+
+    if response.status_code != 200:
+        return -1
+
+    return response.json().get('tracks', {}).get('total', -1)
@@ -0,0 +1,686 @@
+// Dashboard JavaScript functionality
+
+document.addEventListener('DOMContentLoaded', function() {
+    
+    // Modal elements
+    const playlistModal = document.getElementById('playlistModal');
+    const successModal = document.getElementById('successModal');
+    const createPlaylistBtn = document.getElementById('createPlaylistBtn');
+    const cancelBtn = document.getElementById('cancelBtn');
+    const confirmCreateBtn = document.getElementById('confirmCreateBtn');
+    const closeSuccessBtn = document.getElementById('closeSuccessBtn');
+    const playlistNameInput = document.getElementById('playlistName');
+    const closeBtns = document.querySelectorAll('.close');
+
+    // Menu elements
+    const hamburgerBtn = document.getElementById('hamburgerBtn');
+    const sideMenu = document.getElementById('sideMenu');
+    const sideMenuOverlay = document.getElementById('sideMenuOverlay');
+    const closeMenuBtn = document.getElementById('closeMenuBtn');
+
+    // Menu functionality
+    function openSideMenu() {
+        sideMenu.classList.add('open');
+        hamburgerBtn.classList.add('active');
+        document.body.style.overflow = 'hidden'; // Prevent background scrolling
+    }
+
+    function closeSideMenu() {
+        sideMenu.classList.remove('open');
+        hamburgerBtn.classList.remove('active');
+        document.body.style.overflow = 'auto'; // Restore background scrolling
+    }
+
+    // Menu event listeners
+    hamburgerBtn.addEventListener('click', function(e) {
+        e.stopPropagation();
+        if (sideMenu.classList.contains('open')) {
+            closeSideMenu();
+        } else {
+            openSideMenu();
+        }
+    });
+
+    closeMenuBtn.addEventListener('click', closeSideMenu);
+    sideMenuOverlay.addEventListener('click', closeSideMenu);
+
+    // Close side menu on escape key
+    document.addEventListener('keydown', function(event) {
+        if (event.key === 'Escape' && sideMenu.classList.contains('open')) {
+            closeSideMenu();
+        }
+    });
+
+    // Close side menu when clicking a menu item (for smooth navigation)
+    const menuItems = document.querySelectorAll('.menu-item');
+    menuItems.forEach(function(item) {
+        item.addEventListener('click', function() {
+            // Small delay to allow the click to register before closing
+            setTimeout(closeSideMenu, 100);
+        });
+    });
+
+    // Refresh button event listener
+    const refreshBtn = document.getElementById('refreshBtn');
+    if (refreshBtn) {
+        refreshBtn.addEventListener('click', function(e) {
+            e.preventDefault();
+            refreshPage();
+        });
+    }
+
+    // Key sent with playlist requests so the server creates only one playlist per submission, even if it's sent twice
+    let playlistRequestKey = null;
+
+    function newPlaylistRequestKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    // Open playlist creation modal, the button isn't there when the top items failed to load
+    if (createPlaylistBtn) {
+        createPlaylistBtn.addEventListener('click', function() {
+            playlistRequestKey = newPlaylistRequestKey();
+            playlistModal.style.display = 'block';
+            playlistNameInput.focus();
+            clearValidationError(); // Clear any previous errors
+        });
+    }
+
+    // Function to show validation error
+    function showValidationError(message) {
+        // Remove any existing error
+        clearValidationError();
+        
+        // Add error class to input
+        playlistNameInput.classList.add('error');
+        
+        // Create error message element
+        const errorDiv = document.createElement('div');
+        errorDiv.className = 'error-message';
+        errorDiv.textContent = message;
+        
+        // Insert error message after the input
+        playlistNameInput.parentNode.insertBefore(errorDiv, playlistNameInput.nextSibling);
+        
+        // Add shake animation to input
+        playlistNameInput.classList.add('shake');
+        
+        // Remove shake animation after it completes
+        setTimeout(() => {
+            playlistNameInput.classList.remove('shake');
+        }, 500);
+        
+        // Focus on the input
+        playlistNameInput.focus();
+    }
+
+    // Function to clear validation error
+    function clearValidationError() {
+        playlistNameInput.classList.remove('error');
+        const existingError = document.querySelector('.error-message');
+        if (existingError) {
+            existingError.remove();
+        }
+    }
+
+    // Clear error when user starts typing
+    playlistNameInput.addEventListener('input', function() {
+        if (this.classList.contains('error')) {
+            clearValidationError();
+        }
+    });
+
+    // Close modals function
+    function closeModals() {
+        playlistModal.style.display = 'none';
+        successModal.style.display = 'none';
+        playlistNameInput.value = '';
+        clearValidationError(); // Clear any validation errors
+    }
+
+    // Close modal event listeners
+    closeBtns.forEach(function(btn) {
+        btn.addEventListener('click', closeModals);
+    });
+
+    cancelBtn.addEventListener('click', closeModals);
+    closeSuccessBtn.addEventListener('click', function() {
+        successModal.style.display = 'none';
+    });
+
+    // Close modal when clicking outside
+    window.addEventListener('click', function(event) {
+        if (event.target === playlistModal) {
+            closeModals();
+        }
+        if (event.target === successModal) {
+            successModal.style.display = 'none';
+        }
+    });
+
+    // Handle Enter key in input
+    playlistNameInput.addEventListener('keypress', function(event) {
+        if (event.key === 'Enter') {
+            event.preventDefault();
+            confirmCreateBtn.click();
+        }
+    });
+
+    // Loading indicator functions
+    function showLoadingOverlay() {
+        // Remove any existing overlay
+        removeLoadingOverlay();
+        
+        // Create overlay
+        const overlay = document.createElement('div');
+        overlay.id = 'loadingOverlay';
+        overlay.className = 'loading-overlay';
+        
+        // Create spinner container
+        const spinnerContainer = document.createElement('div');
+        spinnerContainer.className = 'loading-spinner-container';
+        
+        // Create spinner
+        const spinner = document.createElement('div');
+        spinner.className = 'loading-spinner';
+        
+        // Create loading text
+        const loadingText = document.createElement('div');
+        loadingText.className = 'loading-text';
+        loadingText.textContent = 'Loading your listening data...';
+        
+        // Assemble the overlay
+        spinnerContainer.appendChild(spinner);
+        spinnerContainer.appendChild(loadingText);
+        overlay.appendChild(spinnerContainer);
+        
+        // Add to page
+        document.body.appendChild(overlay);
+    }
+    
+    function removeLoadingOverlay() {
+        const overlay = document.getElementById('loadingOverlay');
+        if (overlay) {
+            overlay.remove();
+        }
+    }
+
+    // Switch time range in place, showing the loading overlay while the data loads
+    const timeRangeButtons = document.querySelectorAll('.time-range-button');
+    timeRangeButtons.forEach(button => {
+        button.addEventListener('click', function(e) {
+            e.preventDefault();
+
+            // Don't reload the currently active button
+            if (this.classList.contains('active')) {
+                return;
+            }
+            
+            loadView(this.href, true);
+        });
+    });
+
+    // Switch item count in place
+    const countDropdown = document.getElementById('item-count');
+    if (countDropdown) {
+        countDropdown.addEventListener('change', function() {
+            loadView(this.value, true);
+        });
+    }
+
+    // Load the view again when going back or forward through switched views
+    window.addEventListener('popstate', function() {
+        loadView(window.location.href, false);
+    });
+
+    // Fetch the top items for a dashboard URL and swap them into the page, falling back to loading the page itself
+    async function loadView(url, pushHistory) {
+        const viewUrl = new URL(url, window.location.origin);
+
+        showLoadingOverlay();
+
+        try {
+            const response = await fetch(`/api/top-items${viewUrl.search}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+
+            if (!response.ok) {
+                throw new Error(`Top items request failed with ${response.status}`);
+            }
+
+            const view = await response.json();
+
+            renderView(view);
+
+            if (pushHistory) {
+                history.pushState(null, '', viewUrl.pathname + viewUrl.search);
+            }
+        } catch (error) {
+            console.error('Error switching view:', error);
+            window.location.href = viewUrl.href;
+            return;
+        }
+
+        removeLoadingOverlay();
+    }
+
+    // Update the page to show a view returned by the top items API
+    function renderView(view) {
+
+        // Time range buttons and item count options
+        timeRangeButtons.forEach(button => {
+            button.classList.toggle('active', button.dataset.timeRange === view.time_range);
+        });
+
+        if (countDropdown) {
+            Array.from(countDropdown.options).forEach(option => {
+                const optionUrl = new URL(option.value, window.location.origin);
+                optionUrl.searchParams.set('time_range', view.time_range);
+                option.value = optionUrl.pathname + optionUrl.search;
+                option.selected = optionUrl.searchParams.get('limit') === String(view.limit);
+            });
+        }
+
+        // Genre summary
+        const topGenre = document.getElementById('topGenre');
+        topGenre.textContent = view.genre[0];
+        const genreSpan = document.createElement('span');
+        genreSpan.className = 'intune-text';
+        genreSpan.textContent = view.genre[1];
+        topGenre.appendChild(genreSpan);
+        topGenre.appendChild(document.createTextNode('.'));
+
+        // Section headers
+        document.getElementById('artistsTitle').textContent = `Top Artists (${view.artists.total} total)`;
+        document.getElementById('tracksTitle').textContent = `Top Tracks (${view.tracks.total} total)`;
+        document.getElementById('avgArtistPopularity').textContent = view.artists.avg_popularity;
+        document.getElementById('avgTrackPopularity').textContent = view.tracks.avg_popularity;
+
+        // Cards, padded with placeholders up to the item count
+        renderCards(document.getElementById('artistsGrid'), view.artists, view.limit, 'artist');
+        renderCards(document.getElementById('tracksGrid'), view.tracks, view.limit, 'track');
+
+        // Share and download buttons use the new time range
+        updateShareButtons(view.time_range);
+    }
+
+    // Replace the cards in a grid with the items of a view section
+    function renderCards(grid, section, limit, type) {
+        const fragment = document.createDocumentFragment();
+
+        section.items.forEach(values => {
+            const item = {};
+            section.fields.forEach((field, i) => {
+                item[field] = values[i];
+            });
+            fragment.appendChild(createCard(item, type, false));
+        });
+
+        for (let i = section.items.length; i < limit; i++) {
+            const placeholder = type === 'artist'
+                ? { name: 'No Data Available', image: null, genres: [], popularity: 0, followers: 0, link: '#' }
+                : { name: 'No Data Available', image: null, artists: [''], popularity: 0, release_date: '', link: '#' };
+            fragment.appendChild(createCard(placeholder, type, true));
+        }
+
+        grid.replaceChildren(fragment);
+    }
+
+    // Create an element with a class and optional text
+    function createElement(tag, className, text) {
+        const element = document.createElement(tag);
+        if (className) {
+            element.className = className;
+        }
+        if (text !== undefined) {
+            element.textContent = text;
+        }
+        return element;
+    }
+
+    // Build an artist or track card with the same markup as the dashboard template
+    function createCard(item, type, isPlaceholder) {
+        const card = createElement('div', isPlaceholder ? 'card dashboard-placeholder-card' : 'card');
+
+        // Image, or an icon when there isn't one
+        const cardImage = createElement('div', 'card-image');
+        if (item.image) {
+            const img = document.createElement('img');
+            img.src = item.image;
+            img.alt = item.name;
+            cardImage.appendChild(img);
+        } else {
+            const placeholderImage = createElement('div', 'placeholder-image');
+            placeholderImage.appendChild(createElement('i', type === 'artist' ? 'fas fa-user' : 'fas fa-music'));
+            cardImage.appendChild(placeholderImage);
+        }
+        card.appendChild(cardImage);
+
+        const cardContent = createElement('div', 'card-content');
+
+        // Name with tooltip
+        const tooltip = createElement('div', 'tooltip');
+        tooltip.appendChild(createElement('h3', type === 'artist' ? 'artist-name' : 'track-name', item.name));
+        tooltip.appendChild(createElement('span', 'tooltip-text', item.name));
+        cardContent.appendChild(tooltip);
+
+        // Genres for artists, artist names for tracks
+        const tags = createElement('div', 'tags');
+        const tagValues = type === 'artist' ? item.genres : item.artists;
+        if (tagValues && tagValues.length > 0) {
+            tagValues.forEach(value => tags.appendChild(createElement('span', 'tag', value)));
+        } else {
+            tags.appendChild(createElement('span', 'tag', type === 'artist' ? 'No genres listed' : 'No artists listed'));
+        }
+        cardContent.appendChild(tags);
+
+        // Popularity, and followers or release date
+        const stats = createElement('div', 'stats');
+        const popularity = createElement('div', 'stat');
+        popularity.appendChild(createElement('i', 'fas fa-fire'));
+        popularity.appendChild(createElement('span', null, `${item.popularity}/100`));
+        stats.appendChild(popularity);
+
+        const detail = createElement('div', 'stat');
+        detail.appendChild(createElement('i', type === 'artist' ? 'fas fa-users' : 'fas fa-calendar'));
+        detail.appendChild(createElement('span', null, type === 'artist' ? item.followers : item.release_date));
+        stats.appendChild(detail);
+        cardContent.appendChild(stats);
+
+        // Spotify link
+        const link = createElement('a', 'spotify-link');
+        link.href = item.link;
+        link.target = '_blank';
+        link.appendChild(createElement('i', 'fab fa-spotify'));
+        link.appendChild(document.createTextNode(' Open in Spotify'));
+        cardContent.appendChild(link);
+
+        card.appendChild(cardContent);
+        return card;
+    }
+
+    function refreshPage() {
+        const refreshBtn = document.getElementById('refreshBtn');
+
+        if (!refreshBtn) return;
+
+        // Prevent mutliple clicks
+        if (refreshBtn.classList.contains('refreshing')) {
+            return;
+        }
+
+        refreshBtn.classList.add('refreshing');
+        refreshBtn.innerHTML = '<i class="fa-solid fa-arrows-rotate"></i> Refreshing...';
+        refreshBtn.disabled = true;
+
+        // Show loading overlay
+        showLoadingOverlay();
+
+        // Get current URL params to preserve state
+        const urlParams = new URLSearchParams(window.location.search);
+        const timeRange = urlParams.get('time_range') || 'short_term';
+        const limit = urlParams.get('limit') || '10';
+
+        window.location.href = `/dashboard?time_range=${timeRange}&limit=${limit}&refresh=1`;
+    }
+
+    // Create playlist function with validation
+    confirmCreateBtn.addEventListener('click', async function() {
+        const playlistName = playlistNameInput.value.trim();
+        
+        // Validation: Check if playlist name is empty
+        if (!playlistName) {
+            showValidationError('Please enter a playlist name.');
+            return;
+        }
+
+        // Ignore clicks while a request is already running
+        if (confirmCreateBtn.disabled) {
+            return;
+        }
+
+        // Disable button and show loading state
+        confirmCreateBtn.disabled = true;
+        const originalText = confirmCreateBtn.innerHTML;
+        confirmCreateBtn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Creating...';
+
+        try {
+            const response = await fetch('/create-playlist', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                    'Idempotency-Key': `${playlistRequestKey}:${playlistName}`
+                },
+                body: JSON.stringify({
+                    playlist_name: playlistName
+                })
+            });
+
+            const result = await response.json();
+
+            if (result.success) {
+                // The next playlist gets a new key
+                playlistRequestKey = newPlaylistRequestKey();
+
+                // Close creation modal
+                playlistModal.style.display = 'none';
+                playlistNameInput.value = '';
+                clearValidationError();
+
+                // Show success modal with playlist details
+                document.getElementById('successMessage').textContent = 
+                    `"${result.playlist.name}" has been created with ${result.playlist.tracks_added} tracks!`;
+                document.getElementById('openPlaylistBtn').href = result.playlist.url;
+                successModal.style.display = 'block';
+            } else {
+                showValidationError('Error creating playlist: ' + result.error);
+            }
+        } catch (error) {
+            console.error('Error creating playlist:', error);
+            showValidationError('An error occurred while creating the playlist. Please try again.');
+        } finally {
+            // Reset button to original state
+            confirmCreateBtn.disabled = false;
+            confirmCreateBtn.innerHTML = originalText;
+        }
+    });
+});
+
+document.addEventListener('DOMContentLoaded', function() {
+
+    const shareBtn = document.getElementById('shareStoryBtn');
+    const downloadBtn = document.getElementById('downloadStoryBtn');
+
+    // Detect browser and capabilities
+    const isFirefox = navigator.userAgent.toLowerCase().includes('firefox');
+    const isMobile = /iPhone|iPad|iPod|Android/i.test(navigator.userAgent);
+    const hasWebShare = navigator.share;
+    const hasFileShare = hasWebShare && navigator.canShare && navigator.canShare({ files: [new File([], 'test')] });
+    
+    console.log('Browser detection:', { isFirefox, isMobile, hasWebShare, hasFileShare });
+    
+    // Get current time range from URL
+    const urlParams = new URLSearchParams(window.location.search);
+    const timeRange = urlParams.get('time_range') || 'short_term';
+    
+    if (isFirefox) {
+        // Firefox - always show download option
+        shareBtn.style.display = 'none';
+        downloadBtn.style.display = 'inline-block';
+        
+    } else if (hasFileShare) {
+        // Modern browsers with file sharing support
+        shareBtn.style.display = 'inline-block';
+        
+    } else if (hasWebShare) {
+        // Browsers with Web Share API but no file support
+        shareBtn.style.display = 'inline-block';
+        
+    } else {
+        // No Web Share API support - show download
+        shareBtn.style.display = 'none';
+        downloadBtn.style.display = 'inline-block';
+    }
+
+    updateShareButtons(timeRange);
+});
+
+// Set the share and download button text for a time range, and point the download at its story
+function updateShareButtons(timeRange) {
+
+    const shareBtn = document.getElementById('shareStoryBtn');
+    const downloadBtn = document.getElementById('downloadStoryBtn');
+
+    // Determine button text based on time range
+    let shareText, downloadText;
+    if (timeRange === 'short_term') {
+        shareText = 'Share Your Last Month';
+        downloadText = 'Download Your Last Month';
+    } else if (timeRange === 'medium_term') {
+        shareText = 'Share Your Last 6 Months';
+        downloadText = 'Download Your Last 6 Months';
+    } else if (timeRange === 'long_term') {
+        shareText = 'Share Your Last Year';
+        downloadText = 'Download Your Last Year';
+    } else {
+        shareText = 'Share Your Top Items';
+        downloadText = 'Download Your Top Items';
+    }
+
+    shareBtn.innerHTML = `<i class="fas fa-share"></i> ${shareText}`;
+    downloadBtn.innerHTML = `<i class="fas fa-download"></i> ${downloadText}`;
+    downloadBtn.href = `/generate-story?time_range=${timeRange}`;
+}
+
+async function shareStory() {
+
+    const btn = document.getElementById('shareStoryBtn');
+    const originalText = btn.innerHTML;
+    
+    // Detect browser capabilities
+    const isFirefox = navigator.userAgent.toLowerCase().includes('firefox');
+    const hasFileShare = navigator.canShare && navigator.canShare({ files: [new File([], 'test')] });
+
+    try {
+        // Show loading state
+        btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generating Share...';
+        btn.disabled = true;
+
+        // Firefox fallback - redirect to download
+        if (isFirefox) {
+            // Get current time range from URL
+            const urlParams = new URLSearchParams(window.location.search);
+            const timeRange = urlParams.get('time_range') || 'short_term';
+            window.location.href = `/generate-story?time_range=${timeRange}`;
+            btn.innerHTML = originalText;
+            btn.disabled = false;
+            return;
+        }
+        
+        // Get current time range from URL
+        const urlParams = new URLSearchParams(window.location.search);
+        const timeRange = urlParams.get('time_range') || 'short_term';
+        
+        // Generate the story image
+        const response = await fetch(`/generate-story?time_range=${timeRange}`);
+        if (!response.ok) throw new Error('Failed to generate story');
+        
+        const blob = await response.blob();
+        
+        // Update button text for sharing
+        btn.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Sharing...';
+
+        // Try file sharing first if supported
+        if (hasFileShare) {
+            const file = new File([blob], 'intune-story.png', { 
+                type: 'image/png',
+                lastModified: Date.now() 
+            });
+
+            await navigator.share({
+                title: 'My InTune Listening',
+                text: 'Check out my top artists and tracks!',
+                files: [file]
+            });
+
+        } else if (navigator.share) {
+            // Fallback text/URL share
+            await navigator.share({
+                title: 'My InTune Listening',
+                text: 'Find out your top artists and tracks using:',
+                url: window.location.origin
+            });
+
+        } else {
+            // Final fallback, trigger image download
+            const url = URL.createObjectURL(blob);
+            const a = document.createElement('a');
+            a.href = url;
+            a.download = 'intune-story.png';
+            document.body.appendChild(a);
+            a.click();
+            document.body.removeChild(a);
+            URL.revokeObjectURL(url);
+
+            showInstructions('Image downloaded, you can now share your listening!')
+        }
+
+        // Reset button
+        btn.innerHTML = originalText;
+        btn.disabled = false;
+
+    } catch (error) {
+
+        console.log('Share failed', error);
+        
+        // Reset button
+        btn.innerHTML = originalText;
+        btn.disabled = false;
+        
+        // Error handling
+        if (error.name !== 'AbortError') {
+            // User canceled, do nothing
+            return;
+        } else if (error.name == 'NotSupportedError') {
+            showInstructions('Sharing not available on this browser, downloading your share image...')
+            const urlParams = new URLSearchParams(window.location.search);
+            const timeRange = urlParams.get('time_range') || 'short_term';
+            window.location.href = `/generate-story?time_range=${timeRange}`;
+        } else {
+            // For all other errors, show download option
+            showInstructions('Sharing failed, downloading your share image instead...');
+            const urlParams = new URLSearchParams(window.location.search);
+            const timeRange = urlParams.get('time_range') || 'short_term';
+            window.location.href = `/generate-story?time_range=${timeRange}`;
+        }
+    }
+}
+
+function showDownloadSpinner(element) {
+    
+    const originalText = element.innerHTML;
+    
+    // Show spinner
+    element.innerHTML = '<i class="fas fa-spinner fa-spin"></i> Generating Image...';
+    element.style.pointerEvents = 'none'; // Prevent multiple clicks
+    
+    // Reset spinner after a set amount of time
+    setTimeout(function() {
+        element.innerHTML = originalText;
+        element.style.pointerEvents = 'auto';
+    }, 3000); // 3 seconds - adjust as needed based on server response time
+    
+    // Also listen for page visibility change to reset faster if user comes back
+    const resetButton = function() {
+        if (!document.hidden) {
+            element.innerHTML = originalText;
+            element.style.pointerEvents = 'auto';
+            document.removeEventListener('visibilitychange', resetButton);
+        }
+    };
+    
+    document.addEventListener('visibilitychange', resetButton);
+}
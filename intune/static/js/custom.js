@@ -212,6 +212,12 @@ async function performModalSearch(query) {
     }
 }
 
+// Fields of each search result used by displaySearchResults, the rest are left out of the response
+const SEARCH_FIELDS = {
+    artist: ['id', 'name', 'popularity', 'images.url', 'followers.total', 'genres'],
+    track: ['id', 'name', 'popularity', 'album.name', 'album.release_date', 'album.images.url', 'artists.name']
+};
+
 async function searchSpotify(query, type) {
     // Make API request to your Flask backend which will handle the Spotify API call
     const response = await fetch('/api/search', {
@@ -222,7 +228,8 @@ async function searchSpotify(query, type) {
         body: JSON.stringify({
             query: query,
             type: type,
-            limit: 10
+            limit: 10,
+            fields: SEARCH_FIELDS[type]
         })
     });
 
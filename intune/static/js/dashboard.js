@@ -69,12 +69,25 @@ document.addEventListener('DOMContentLoaded', function() {
         });
     }
 
-    // Open playlist creation modal
-    createPlaylistBtn.addEventListener('click', function() {
-        playlistModal.style.display = 'block';
-        playlistNameInput.focus();
-        clearValidationError(); // Clear any previous errors
-    });
+    // Key sent with playlist requests so the server creates only one playlist per submission, even if it's sent twice
+    let playlistRequestKey = null;
+
+    function newPlaylistRequestKey() {
+        if (window.crypto && crypto.randomUUID) {
+            return crypto.randomUUID();
+        }
+        return `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+    }
+
+    // Open playlist creation modal, the button isn't there when the top items failed to load
+    if (createPlaylistBtn) {
+        createPlaylistBtn.addEventListener('click', function() {
+            playlistRequestKey = newPlaylistRequestKey();
+            playlistModal.style.display = 'block';
+            playlistNameInput.focus();
+            clearValidationError(); // Clear any previous errors
+        });
+    }
 
     // Function to show validation error
     function showValidationError(message) {
@@ -195,27 +208,198 @@ document.addEventListener('DOMContentLoaded', function() {
         }
     }
 
-    // Add loading indicators to time range buttons
+    // Switch time range in place, showing the loading overlay while the data loads
     const timeRangeButtons = document.querySelectorAll('.time-range-button');
     timeRangeButtons.forEach(button => {
         button.addEventListener('click', function(e) {
-            // Don't show loading for the currently active button
+            e.preventDefault();
+
+            // Don't reload the currently active button
             if (this.classList.contains('active')) {
-                e.preventDefault();
                 return;
             }
             
-            showLoadingOverlay();
+            loadView(this.href, true);
         });
     });
 
-    // Add loading indicator to count dropdown
+    // Switch item count in place
     const countDropdown = document.getElementById('item-count');
     if (countDropdown) {
         countDropdown.addEventListener('change', function() {
-            showLoadingOverlay();
-            // Let the navigation proceed normally via the onchange handler
+            loadView(this.value, true);
+        });
+    }
+
+    // Load the view again when going back or forward through switched views
+    window.addEventListener('popstate', function() {
+        loadView(window.location.href, false);
+    });
+
+    // Fetch the top items for a dashboard URL and swap them into the page, falling back to loading the page itself
+    async function loadView(url, pushHistory) {
+        const viewUrl = new URL(url, window.location.origin);
+
+        showLoadingOverlay();
+
+        try {
+            const response = await fetch(`/api/top-items${viewUrl.search}`, {
+                headers: { 'Accept': 'application/json' }
+            });
+
+            if (!response.ok) {
+                throw new Error(`Top items request failed with ${response.status}`);
+            }
+
+            const view = await response.json();
+
+            renderView(view);
+
+            if (pushHistory) {
+                history.pushState(null, '', viewUrl.pathname + viewUrl.search);
+            }
+        } catch (error) {
+            console.error('Error switching view:', error);
+            window.location.href = viewUrl.href;
+            return;
+        }
+
+        removeLoadingOverlay();
+    }
+
+    // Update the page to show a view returned by the top items API
+    function renderView(view) {
+
+        // Time range buttons and item count options
+        timeRangeButtons.forEach(button => {
+            button.classList.toggle('active', button.dataset.timeRange === view.time_range);
+        });
+
+        if (countDropdown) {
+            Array.from(countDropdown.options).forEach(option => {
+                const optionUrl = new URL(option.value, window.location.origin);
+                optionUrl.searchParams.set('time_range', view.time_range);
+                option.value = optionUrl.pathname + optionUrl.search;
+                option.selected = optionUrl.searchParams.get('limit') === String(view.limit);
+            });
+        }
+
+        // Genre summary
+        const topGenre = document.getElementById('topGenre');
+        topGenre.textContent = view.genre[0];
+        const genreSpan = document.createElement('span');
+        genreSpan.className = 'intune-text';
+        genreSpan.textContent = view.genre[1];
+        topGenre.appendChild(genreSpan);
+        topGenre.appendChild(document.createTextNode('.'));
+
+        // Section headers
+        document.getElementById('artistsTitle').textContent = `Top Artists (${view.artists.total} total)`;
+        document.getElementById('tracksTitle').textContent = `Top Tracks (${view.tracks.total} total)`;
+        document.getElementById('avgArtistPopularity').textContent = view.artists.avg_popularity;
+        document.getElementById('avgTrackPopularity').textContent = view.tracks.avg_popularity;
+
+        // Cards, padded with placeholders up to the item count
+        renderCards(document.getElementById('artistsGrid'), view.artists, view.limit, 'artist');
+        renderCards(document.getElementById('tracksGrid'), view.tracks, view.limit, 'track');
+
+        // Share and download buttons use the new time range
+        updateShareButtons(view.time_range);
+    }
+
+    // Replace the cards in a grid with the items of a view section
+    function renderCards(grid, section, limit, type) {
+        const fragment = document.createDocumentFragment();
+
+        section.items.forEach(values => {
+            const item = {};
+            section.fields.forEach((field, i) => {
+                item[field] = values[i];
+            });
+            fragment.appendChild(createCard(item, type, false));
         });
+
+        for (let i = section.items.length; i < limit; i++) {
+            const placeholder = type === 'artist'
+                ? { name: 'No Data Available', image: null, genres: [], popularity: 0, followers: 0, link: '#' }
+                : { name: 'No Data Available', image: null, artists: [''], popularity: 0, release_date: '', link: '#' };
+            fragment.appendChild(createCard(placeholder, type, true));
+        }
+
+        grid.replaceChildren(fragment);
+    }
+
+    // Create an element with a class and optional text
+    function createElement(tag, className, text) {
+        const element = document.createElement(tag);
+        if (className) {
+            element.className = className;
+        }
+        if (text !== undefined) {
+            element.textContent = text;
+        }
+        return element;
+    }
+
+    // Build an artist or track card with the same markup as the dashboard template
+    function createCard(item, type, isPlaceholder) {
+        const card = createElement('div', isPlaceholder ? 'card dashboard-placeholder-card' : 'card');
+
+        // Image, or an icon when there isn't one
+        const cardImage = createElement('div', 'card-image');
+        if (item.image) {
+            const img = document.createElement('img');
+            img.src = item.image;
+            img.alt = item.name;
+            cardImage.appendChild(img);
+        } else {
+            const placeholderImage = createElement('div', 'placeholder-image');
+            placeholderImage.appendChild(createElement('i', type === 'artist' ? 'fas fa-user' : 'fas fa-music'));
+            cardImage.appendChild(placeholderImage);
+        }
+        card.appendChild(cardImage);
+
+        const cardContent = createElement('div', 'card-content');
+
+        // Name with tooltip
+        const tooltip = createElement('div', 'tooltip');
+        tooltip.appendChild(createElement('h3', type === 'artist' ? 'artist-name' : 'track-name', item.name));
+        tooltip.appendChild(createElement('span', 'tooltip-text', item.name));
+        cardContent.appendChild(tooltip);
+
+        // Genres for artists, artist names for tracks
+        const tags = createElement('div', 'tags');
+        const tagValues = type === 'artist' ? item.genres : item.artists;
+        if (tagValues && tagValues.length > 0) {
+            tagValues.forEach(value => tags.appendChild(createElement('span', 'tag', value)));
+        } else {
+            tags.appendChild(createElement('span', 'tag', type === 'artist' ? 'No genres listed' : 'No artists listed'));
+        }
+        cardContent.appendChild(tags);
+
+        // Popularity, and followers or release date
+        const stats = createElement('div', 'stats');
+        const popularity = createElement('div', 'stat');
+        popularity.appendChild(createElement('i', 'fas fa-fire'));
+        popularity.appendChild(createElement('span', null, `${item.popularity}/100`));
+        stats.appendChild(popularity);
+
+        const detail = createElement('div', 'stat');
+        detail.appendChild(createElement('i', type === 'artist' ? 'fas fa-users' : 'fas fa-calendar'));
+        detail.appendChild(createElement('span', null, type === 'artist' ? item.followers : item.release_date));
+        stats.appendChild(detail);
+        cardContent.appendChild(stats);
+
+        // Spotify link
+        const link = createElement('a', 'spotify-link');
+        link.href = item.link;
+        link.target = '_blank';
+        link.appendChild(createElement('i', 'fab fa-spotify'));
+        link.appendChild(document.createTextNode(' Open in Spotify'));
+        cardContent.appendChild(link);
+
+        card.appendChild(cardContent);
+        return card;
     }
 
     function refreshPage() {
@@ -240,7 +424,7 @@ document.addEventListener('DOMContentLoaded', function() {
         const timeRange = urlParams.get('time_range') || 'short_term';
         const limit = urlParams.get('limit') || '10';
 
-        window.location.href = `/dashboard?time_range=${timeRange}&limit=${limit}`;
+        window.location.href = `/dashboard?time_range=${timeRange}&limit=${limit}&refresh=1`;
     }
 
     // Create playlist function with validation
@@ -253,6 +437,11 @@ document.addEventListener('DOMContentLoaded', function() {
             return;
         }
 
+        // Ignore clicks while a request is already running
+        if (confirmCreateBtn.disabled) {
+            return;
+        }
+
         // Disable button and show loading state
         confirmCreateBtn.disabled = true;
         const originalText = confirmCreateBtn.innerHTML;
@@ -263,6 +452,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Idempotency-Key': `${playlistRequestKey}:${playlistName}`
                 },
                 body: JSON.stringify({
                     playlist_name: playlistName
@@ -272,6 +462,9 @@ document.addEventListener('DOMContentLoaded', function() {
             const result = await response.json();
 
             if (result.success) {
+                // The next playlist gets a new key
+                playlistRequestKey = newPlaylistRequestKey();
+
                 // Close creation modal
                 playlistModal.style.display = 'none';
                 playlistNameInput.value = '';
@@ -313,48 +506,55 @@ document.addEventListener('DOMContentLoaded', function() {
     const urlParams = new URLSearchParams(window.location.search);
     const timeRange = urlParams.get('time_range') || 'short_term';
     
-    // Determine button text based on time range
-    let shareText, downloadText;
-    if (timeRange === 'short_term') {
-        shareText = 'Share Your Last Month';
-        downloadText = 'Download Your Last Month';
-    } else if (timeRange === 'medium_term') {
-        shareText = 'Share Your Last 6 Months';
-        downloadText = 'Download Your Last 6 Months';
-    } else if (timeRange === 'long_term') {
-        shareText = 'Share Your Last Year';
-        downloadText = 'Download Your Last Year';
-    } else {
-        shareText = 'Share Your Top Items';
-        downloadText = 'Download Your Top Items';
-    }
-    
     if (isFirefox) {
         // Firefox - always show download option
         shareBtn.style.display = 'none';
         downloadBtn.style.display = 'inline-block';
         
-        // Update button text for Firefox
-        downloadBtn.innerHTML = `<i class="fas fa-download"></i> ${downloadText}`;
-        
     } else if (hasFileShare) {
         // Modern browsers with file sharing support
         shareBtn.style.display = 'inline-block';
-        shareBtn.innerHTML = `<i class="fas fa-share"></i> ${shareText}`;
         
     } else if (hasWebShare) {
         // Browsers with Web Share API but no file support
         shareBtn.style.display = 'inline-block';
-        shareBtn.innerHTML = `<i class="fas fa-share"></i> ${shareText}`;
         
     } else {
         // No Web Share API support - show download
         shareBtn.style.display = 'none';
         downloadBtn.style.display = 'inline-block';
-        downloadBtn.innerHTML = `<i class="fas fa-download"></i> ${downloadText}`;
     }
+
+    updateShareButtons(timeRange);
 });
 
+// Set the share and download button text for a time range, and point the download at its story
+function updateShareButtons(timeRange) {
+
+    const shareBtn = document.getElementById('shareStoryBtn');
+    const downloadBtn = document.getElementById('downloadStoryBtn');
+
+    // Determine button text based on time range
+    let shareText, downloadText;
+    if (timeRange === 'short_term') {
+        shareText = 'Share Your Last Month';
+        downloadText = 'Download Your Last Month';
+    } else if (timeRange === 'medium_term') {
+        shareText = 'Share Your Last 6 Months';
+        downloadText = 'Download Your Last 6 Months';
+    } else if (timeRange === 'long_term') {
+        shareText = 'Share Your Last Year';
+        downloadText = 'Download Your Last Year';
+    } else {
+        shareText = 'Share Your Top Items';
+        downloadText = 'Download Your Top Items';
+    }
+
+    shareBtn.innerHTML = `<i class="fas fa-share"></i> ${shareText}`;
+    downloadBtn.innerHTML = `<i class="fas fa-download"></i> ${downloadText}`;
+    downloadBtn.href = `/generate-story?time_range=${timeRange}`;
+}
+
 async function shareStory() {
 
     const btn = document.getElementById('shareStoryBtn');